@@ -0,0 +1,66 @@
+"""Benchmark the time taken to import epicluster and start working.
+
+Each statement is timed in a fresh interpreter, since modules which have
+already been imported are not loaded again. The minimum over repeats is
+reported, and results are written as JSON:
+
+    python benchmarks/bench_import.py --output import.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+
+STATEMENTS = {
+    'import': 'import epicluster as ec',
+    'public_api': 'import epicluster as ec; ec.PoissonModel; ec.MCMCSampler',
+    'build_model': 'import epicluster as ec; '
+                   'ec.PoissonModel([1, 2, 3, 4, 5, 6], [0.1, 0.9])',
+    'first_step': 'import epicluster as ec; '
+                  'ec.PoissonModel([1, 2, 3, 4, 5, 6], [0.1, 0.9])'
+                  '.run_mcmc_step()',
+}
+
+TIMER = '''
+import time
+t0 = time.perf_counter()
+{}
+print(time.perf_counter() - t0)
+'''
+
+
+def time_statement(statement, repeats):
+    """Minimum time in seconds to run a statement in a new interpreter.
+    """
+    times = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, '-c', TIMER.format(statement)],
+            capture_output=True, text=True, check=True)
+        times.append(float(out.stdout))
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default='bench_import.json')
+    args = parser.parse_args(argv)
+
+    results = {
+        'python': platform.python_version(),
+        'results': {},
+    }
+    for name, statement in STATEMENTS.items():
+        t = time_statement(statement, args.repeats)
+        print('{}: {:.1f} ms'.format(name, 1000 * t))
+        results['results'][name] = t
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
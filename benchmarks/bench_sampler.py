@@ -0,0 +1,253 @@
+"""Benchmark the MCMC sampler on synthetic renewal process data.
+
+For each combination of series length, number of chains and true number of
+blocks, this generates a case series with known changepoints, builds a
+PoissonModel and runs the MCMCSampler for a fixed number of iterations. It
+records the model construction time, iterations per second, effective samples
+per second for the number of blocks K and for R(t), and peak memory.
+
+Results are written as JSON, so that runs on different commits can be
+compared:
+
+    python benchmarks/bench_sampler.py --output before.json
+    (change the code)
+    python benchmarks/bench_sampler.py --output after.json \
+        --compare before.json
+
+With --batched, the chains are run together by the BatchedMCMCSampler.
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+import scipy.stats
+import pints
+import epicluster as ec
+
+
+def make_serial_interval(length=20, mean=6.5, sd=4.0):
+    """Discretised gamma serial interval.
+    """
+    shape = (mean / sd) ** 2
+    scale = sd ** 2 / mean
+    cdf = scipy.stats.gamma.cdf(np.arange(length + 1), shape, scale=scale)
+    w = np.diff(cdf)
+    return (w / w.sum()).tolist()
+
+
+DEFAULT_LENGTHS = [100, 500, 1000, 5000]
+DEFAULT_CHAINS = [1, 4]
+DEFAULT_BLOCKS = [1, 4, 10]
+
+
+def make_data(num_time_pts, num_blocks, serial_interval, seed=0,
+              max_growth=10.0):
+    """Simulate local cases from a renewal process with known changepoints.
+
+    R alternates between exp(a) and exp(-a) in equally sized blocks, so that
+    the mean of log R over each pair of blocks is zero. a is log(1.3), or
+    smaller in long blocks, such that the expected cases change by a factor of
+    at most about max_growth within each block.
+
+    Returns
+    -------
+    list of int
+        Cases, including the historical cases before the inference interval
+    numpy.ndarray
+        True value of R at each time point in the inference interval
+    """
+    mean_interval = np.dot(
+        np.arange(1, len(serial_interval) + 1), serial_interval)
+    block_length = num_time_pts / num_blocks
+    a = min(np.log(1.3), np.log(max_growth) * mean_interval / block_length)
+    r_values = np.exp(np.where(np.arange(num_blocks) % 2 == 0, a, -a))
+    changepoints = [i * num_time_pts // num_blocks
+                    for i in range(1, num_blocks)]
+    true_r = ec.piecewise_constant_r(r_values, changepoints, num_time_pts)
+
+    cases = ec.simulate_renewal(true_r, serial_interval, 20, seed=seed)[0]
+
+    return cases.tolist(), true_r
+
+
+def effective_samples(chains):
+    """Total effective sample size over chains, per column.
+
+    Parameters
+    ----------
+    chains : numpy.ndarray
+        Samples of shape (chains, iterations, parameters)
+
+    Returns
+    -------
+    numpy.ndarray
+        Effective sample size of each parameter
+    """
+    ess = np.zeros(chains.shape[2])
+    for chain in chains:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            chain_ess = np.asarray(
+                pints.effective_sample_size(chain), dtype=float)
+        # A chain which never moves has one effective sample
+        ess += np.where(np.isfinite(chain_ess), chain_ess, 1.0)
+    return ess
+
+
+def sample(model, num_chains, iterations, seed, batched=False):
+    """Run the sampler from a fixed seed.
+
+    Returns
+    -------
+    numpy.ndarray
+        R(t) of each retained sample
+    numpy.ndarray
+        Number of blocks of each retained sample
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    if batched:
+        sampler = ec.BatchedMCMCSampler(model, num_chains)
+        params, changepoints, blocks = \
+            sampler.run_mcmc(num_mcmc_samples=iterations)
+        r_t = sampler.expand_params(changepoints, params)
+    else:
+        sampler = ec.MCMCSampler(model, num_chains)
+        params_chain, assign_chain, blocks = \
+            sampler.run_mcmc(num_mcmc_samples=iterations)
+        r_t = np.asarray([np.asarray(phi)[z]
+                          for phi, z in zip(params_chain, assign_chain)])
+    return r_t, blocks
+
+
+def run_case(num_time_pts, num_chains, num_blocks, iterations, seed,
+             batched=False):
+    """Run one benchmark configuration and return its measurements.
+
+    The timings come from a run without memory tracing, and the peak memory
+    from a second, traced run with the same seed, since tracing slows the
+    sampler several times over.
+    """
+    serial_interval = make_serial_interval()
+    cases, _ = make_data(num_time_pts, num_blocks, serial_interval, seed)
+
+    t0 = time.perf_counter()
+    model = ec.PoissonModel(cases, serial_interval)
+    construction_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    r_t, blocks = sample(model, num_chains, iterations, seed, batched)
+    run_time = time.perf_counter() - t0
+
+    tracemalloc.start()
+    sample(ec.PoissonModel(cases, serial_interval),
+           num_chains, iterations, seed, batched)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The outputs are ordered by iteration, then by chain
+    blocks = np.asarray(blocks, dtype=float).reshape(
+        iterations, num_chains).T[:, :, np.newaxis]
+    r_t = np.reshape(
+        r_t, (iterations, num_chains, num_time_pts)).swapaxes(0, 1)
+
+    # Discard the first half as burn in
+    blocks = blocks[:, iterations // 2:]
+    r_t = r_t[:, iterations // 2:]
+
+    ess_k = effective_samples(blocks)[0]
+    ess_r = effective_samples(r_t)
+
+    return {
+        'num_time_pts': num_time_pts,
+        'num_chains': num_chains,
+        'num_blocks': num_blocks,
+        'iterations': iterations,
+        'construction_time_s': construction_time,
+        'run_time_s': run_time,
+        'iterations_per_s': iterations / run_time,
+        'ess_k_per_s': ess_k / run_time,
+        'ess_r_min_per_s': float(ess_r.min()) / run_time,
+        'ess_r_median_per_s': float(np.median(ess_r)) / run_time,
+        'peak_memory_mb': peak_memory / 2**20,
+        'sampler': 'batched' if batched else 'loop',
+        'cache_hit_rate': model.segment_cache.hits / max(
+            1, model.segment_cache.hits + model.segment_cache.misses),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the speed of each configuration relative to a baseline.
+    """
+    def key(r):
+        return r['num_time_pts'], r['num_chains'], r['num_blocks']
+
+    old = {key(r): r for r in baseline['results']}
+    print('{:>6} {:>6} {:>6} {:>12} {:>12}'.format(
+        'T', 'chains', 'blocks', 'iter/s', 'ratio'))
+    for r in results['results']:
+        if key(r) not in old:
+            continue
+        ratio = r['iterations_per_s'] / old[key(r)]['iterations_per_s']
+        print('{:>6} {:>6} {:>6} {:>12.1f} {:>12.2f}'.format(
+            *key(r), r['iterations_per_s'], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+',
+                        default=DEFAULT_LENGTHS)
+    parser.add_argument('--chains', type=int, nargs='+',
+                        default=DEFAULT_CHAINS)
+    parser.add_argument('--blocks', type=int, nargs='+',
+                        default=DEFAULT_BLOCKS)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batched', action='store_true',
+                        help='Use the BatchedMCMCSampler')
+    parser.add_argument('--output', default='bench_sampler.json')
+    parser.add_argument('--compare', default=None,
+                        help='JSON output of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': [],
+    }
+
+    for num_time_pts in args.lengths:
+        for num_chains in args.chains:
+            for num_blocks in args.blocks:
+                r = run_case(num_time_pts, num_chains, num_blocks,
+                             args.iterations, args.seed, args.batched)
+                print('T={num_time_pts} chains={num_chains} '
+                      'blocks={num_blocks}: {iterations_per_s:.1f} iter/s, '
+                      '{ess_k_per_s:.2f} ESS(K)/s, '
+                      '{peak_memory_mb:.1f} MB'.format(**r))
+                results['results'].append(r)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
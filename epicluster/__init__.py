@@ -1,5 +1,45 @@
-from .util import *
-from .model import *
-from .prior import *
-from .poisson_renewal_model import *
-from .posterior import *
+"""Change points in the time-varying reproduction number.
+
+Submodules are imported when one of their names is first accessed, so that
+importing the package is fast.
+"""
+
+import importlib
+
+# Public names, and the submodule defining each of them
+_attributes = {
+    'log_poch': 'util',
+    'poch_negatives': 'util',
+    'LazyModule': 'util',
+    'lazy_import': 'util',
+    'SegmentCache': 'model',
+    'ChangepointProcess': 'model',
+    'RestrictedPYEPPF': 'prior',
+    'PoissonModel': 'poisson_renewal_model',
+    'MCMCSampler': 'posterior',
+    'BatchedMCMCSampler': 'batched_sampler',
+    'NegativeBinomialModel': 'negative_binomial_renewal_model',
+    'piecewise_constant_r': 'simulate',
+    'simulate_renewal': 'simulate',
+    'MultiSeriesPoissonModel': 'multi_series_renewal_model',
+}
+
+__all__ = list(_attributes)
+
+
+def __getattr__(name):
+    if name in _attributes:
+        module = importlib.import_module('.' + _attributes[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+
+    if name in set(_attributes.values()):
+        return importlib.import_module('.' + name, __name__)
+
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_attributes))
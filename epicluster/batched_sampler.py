@@ -0,0 +1,405 @@
+"""Runs MCMC sampling for many chains at once.
+"""
+
+import collections
+import numpy as np
+import epicluster as ec
+
+pints = ec.lazy_import('pints')
+
+
+class BatchedMCMCSampler:
+    """Class for running many mcmc chains together within one process.
+
+    Instead of stepping one model object per chain, the block configuration of
+    every chain is held in a boolean array of shape (chains, time), which is
+    True at the first time point of each block. The split, merge and shuffle
+    proposals, their acceptance, and the Gibbs updates of the change
+    parameters are then carried out for all chains together, using the
+    vectorized block methods of the model (_segment_marginal_likelihoods and
+    _sample_change_params). Each proposal evaluates only the blocks which it
+    removes and adds, whose marginal likelihoods are looked up in the segment
+    cache of the model, shared by all of the chains. Running many chains
+    therefore costs little more than running a few.
+
+    The proposals are the same as those of ChangepointProcess. The Hastings
+    ratios of splits and merges include the probability of choosing each
+    kind of move, which is one rather than q when there is a single block or
+    one block per time point.
+
+    Parameters
+    ----------
+    model : ChangepointProcess
+        Model providing the data, likelihood and hyperparameters. Its current
+        assignments are the starting point of every chain.
+    num_chains : int
+        Number of chains
+    """
+    def __init__(self, model, num_chains):
+        self.model = model
+        self.num_chains = num_chains
+        self.num_time_pts = len(model.assignments)
+
+        z = np.asarray(model.assignments)
+        self.changepoints = np.ones(
+            (num_chains, self.num_time_pts), dtype=bool)
+        self.changepoints[:, 1:] = z[1:] != z[:-1]
+
+        self.prior = ec.RestrictedPYEPPF()
+
+    def _segments(self, changepoints):
+        """Find the blocks of every chain.
+
+        Returns
+        -------
+        numpy.ndarray
+            Chain of each block
+        numpy.ndarray
+            Index of the first time point in each block
+        numpy.ndarray
+            Index one past the last time point in each block
+        numpy.ndarray
+            Position of the first block of each chain in the above arrays
+        """
+        chain, starts = np.nonzero(changepoints)
+        ends = np.empty_like(starts)
+        ends[:-1] = starts[1:]
+        last = np.append(chain[1:] != chain[:-1], True)
+        ends[last] = self.num_time_pts
+
+        num_blocks = changepoints.sum(axis=1)
+        first = np.cumsum(num_blocks) - num_blocks
+        return chain, starts, ends, first
+
+    def log_posterior(self, changepoints):
+        """Evaluate the log posterior of the block configuration of each chain.
+
+        Parameters
+        ----------
+        changepoints : numpy.ndarray
+            Boolean array of shape (chains, time), True at the start of each
+            block
+
+        Returns
+        -------
+        numpy.ndarray
+            Log posterior of each chain
+        """
+        model = self.model
+        chain, starts, ends, _ = self._segments(changepoints)
+
+        mll = model.segment_cache.lookup(
+            starts, ends, model._segment_marginal_likelihoods,
+            model._likelihood_hyperparameters())
+        p = np.bincount(chain, weights=mll, minlength=len(changepoints))
+        p += self.prior.batch(ends - starts, chain, len(changepoints),
+                              model.hyper_sigma, model.hyper_theta)
+        return p
+
+    def _log_posterior_change(self, k, removed, added):
+        """Change in the log posterior of each chain when some of its blocks
+        are replaced by others.
+
+        Only the blocks which are removed and added are evaluated, and their
+        marginal likelihoods are looked up in the segment cache of the model.
+
+        Parameters
+        ----------
+        k : numpy.ndarray
+            Number of blocks in each chain
+        removed : tuple of numpy.ndarray
+            Chain, start and end of each block which is removed
+        added : tuple of numpy.ndarray
+            Chain, start and end of each block which replaces them
+
+        Returns
+        -------
+        numpy.ndarray
+            Log posterior after the change minus that before it, for each chain
+        """
+        model = self.model
+        num_removed = len(removed[0])
+
+        mll = model.segment_cache.lookup(
+            np.concatenate((removed[1], added[1])),
+            np.concatenate((removed[2], added[2])),
+            model._segment_marginal_likelihoods,
+            model._likelihood_hyperparameters())
+
+        p = self.prior.batch_change(
+            k, removed[2] - removed[1], removed[0], added[2] - added[1],
+            added[0], model.hyper_sigma, model.hyper_theta)
+        p += np.bincount(added[0], weights=mll[num_removed:],
+                         minlength=self.num_chains)
+        p -= np.bincount(removed[0], weights=mll[:num_removed],
+                         minlength=self.num_chains)
+        return p
+
+    def _log_split_prob(self, k):
+        """Log probability of choosing a split, rather than a merge, with k
+        blocks.
+        """
+        q = self.model.q
+        T = self.num_time_pts
+        with np.errstate(divide='ignore'):
+            return np.log(np.where(k == 1, 1.0, np.where(k < T, q, 0.0)))
+
+    def _log_merge_prob(self, k):
+        """Log probability of choosing a merge, rather than a split, with k
+        blocks.
+        """
+        q = self.model.q
+        T = self.num_time_pts
+        with np.errstate(divide='ignore'):
+            return np.log(np.where(k == 1, 0.0, np.where(k < T, 1 - q, 1.0)))
+
+    def _accept(self, log_alpha, active):
+        """Accept or reject the proposals of the active chains.
+
+        Returns
+        -------
+        numpy.ndarray
+            Whether the proposal of each chain is accepted
+        """
+        u = np.random.random(self.num_chains)
+        with np.errstate(invalid='ignore'):
+            return active & (np.log(u) < log_alpha)
+
+    def _split_merge_step(self):
+        """Propose a split or a merge in every chain, and accept or reject
+        them.
+        """
+        T = self.num_time_pts
+        chain, starts, ends, first = self._segments(self.changepoints)
+        sizes = ends - starts
+        k = self.changepoints.sum(axis=1)
+
+        splittable = sizes > 1
+        ngk = np.bincount(chain[splittable], minlength=self.num_chains)
+
+        u = np.random.random(self.num_chains)
+        split = ((k == 1) | (u < self.model.q)) & (k < T)
+        merge = ~split & (k > 1)
+
+        log_alpha = np.zeros(self.num_chains)
+        idx = np.arange(self.num_chains)
+
+        # Splits: choose a splittable block, then a location within it
+        c = idx[split]
+        splittable_blocks = np.flatnonzero(splittable)
+        offset = np.cumsum(ngk) - ngk
+        r = (np.random.random(len(c)) * ngk[c]).astype(int)
+        j = splittable_blocks[offset[c] + r]
+        ns = sizes[j]
+        new = starts[j] + 1 + (np.random.random(len(c)) * (ns - 1)).astype(int)
+
+        # The reverse move merges the two new blocks
+        log_alpha[c] = self._log_merge_prob(k[c] + 1) - np.log(k[c]) \
+            - self._log_split_prob(k[c]) + np.log(ngk[c] * (ns - 1))
+
+        split_removed = (c, starts[j], ends[j])
+        split_added = (np.concatenate((c, c)),
+                       np.concatenate((starts[j], new)),
+                       np.concatenate((new, ends[j])))
+
+        # Merges: choose a pair of neighbouring blocks
+        cm = idx[merge]
+        jm = first[cm] + (np.random.random(len(cm)) * (k[cm] - 1)).astype(int)
+        ns = sizes[jm]
+        ns1 = sizes[jm + 1]
+
+        # The reverse move splits the merged block
+        ngk1 = ngk[cm] - (ns > 1) - (ns1 > 1) + 1
+        log_alpha[cm] = self._log_split_prob(k[cm] - 1) \
+            - np.log(ngk1 * (ns + ns1 - 1)) \
+            - self._log_merge_prob(k[cm]) + np.log(k[cm] - 1)
+
+        merge_removed = (np.concatenate((cm, cm)),
+                         np.concatenate((starts[jm], starts[jm + 1])),
+                         np.concatenate((ends[jm], ends[jm + 1])))
+        merge_added = (cm, starts[jm], ends[jm + 1])
+
+        log_alpha += self._log_posterior_change(
+            k,
+            tuple(map(np.concatenate, zip(split_removed, merge_removed))),
+            tuple(map(np.concatenate, zip(split_added, merge_added))))
+
+        accept = self._accept(log_alpha, split | merge)
+        a = accept[c]
+        self.changepoints[c[a], new[a]] = True
+        a = accept[cm]
+        self.changepoints[cm[a], starts[jm + 1][a]] = False
+
+    def _shuffle_step(self):
+        """Propose moving the boundary between two neighbouring blocks in every
+        chain with more than one block, and accept or reject them.
+        """
+        chain, starts, ends, first = self._segments(self.changepoints)
+        sizes = ends - starts
+        k = self.changepoints.sum(axis=1)
+
+        active = k > 1
+        c = np.flatnonzero(active)
+
+        # Choose a block which is not the last, and a new boundary with the
+        # next block
+        i = first[c] + (np.random.random(len(c)) * (k[c] - 1)).astype(int)
+        width = sizes[i] + sizes[i + 1] - 1
+        mid = starts[i + 1]
+        new = starts[i] + 1 + (np.random.random(len(c)) * width).astype(int)
+
+        pairs = np.concatenate((c, c))
+        log_alpha = self._log_posterior_change(
+            k,
+            (pairs, np.concatenate((starts[i], mid)),
+             np.concatenate((mid, ends[i + 1]))),
+            (pairs, np.concatenate((starts[i], new)),
+             np.concatenate((new, ends[i + 1]))))
+
+        a = self._accept(log_alpha, active)[c]
+        self.changepoints[c[a], mid[a]] = False
+        self.changepoints[c[a], new[a]] = True
+
+    def _sample_change_params(self):
+        """Draw the change parameters of every block of every chain.
+
+        Returns
+        -------
+        numpy.ndarray
+            Parameter values of shape (blocks, ...), ordered by chain and then
+            by time
+        """
+        chain, starts, ends, first = self._segments(self.changepoints)
+        return self.model._sample_change_params(starts, ends)
+
+    @staticmethod
+    def expand_params(changepoints, params):
+        """Expand the parameter values of each block to each time point.
+
+        Parameters
+        ----------
+        changepoints : numpy.ndarray
+            Boolean array of shape (..., time), True at the start of each
+            block, as returned by run_mcmc
+        params : numpy.ndarray
+            Parameter value of each block, ordered by the leading axes of
+            changepoints and then by time, as returned by run_mcmc
+
+        Returns
+        -------
+        numpy.ndarray
+            Parameter value at each time point, of shape (..., time, ...)
+        """
+        changepoints = np.asarray(changepoints, dtype=bool)
+        assignments = np.cumsum(changepoints, axis=-1) - 1
+        num_blocks = changepoints.sum(axis=-1)
+        first = (np.cumsum(num_blocks) - num_blocks.ravel()).reshape(
+            num_blocks.shape)
+        return np.asarray(params)[first[..., np.newaxis] + assignments]
+
+    def run_mcmc(self,
+                 num_mcmc_samples=0,
+                 Rhat_thresh=0,
+                 progress=False,
+                 max_mcmc=10000,
+                 burn_in=0,
+                 thin=1,
+                 keep_last_half=False):
+        """Run MCMC for all chains to generate samples from the posterior.
+
+        The arguments are the same as for MCMCSampler.run_mcmc. To bound
+        memory use, the retained samples are stored as changepoint indicators
+        and the parameter value of each block, rather than expanded to every
+        time point. expand_params gives the value at each time point.
+
+        Parameters
+        ----------
+        num_mcmc_samples : int
+            The total number of MCMC samples to run
+        Rhat_thresh : float, optional (0)
+            If supplied, stop once Rhat of the number of regimes, over the
+            second half of the iterations, is below this value
+        progress : bool, optional (False)
+            Whether or not to print iteration number
+        max_mcmc : int, optional (10000)
+            Maximum number of MCMC samples to run when using Rhat_thresh
+        burn_in : int, optional (0)
+            Number of initial iterations to discard
+        thin : int, optional (1)
+            Keep only every thin-th iteration after the burn in
+        keep_last_half : bool, optional (False)
+            Keep only the second half of the iterations, matching the window
+            used for Rhat
+
+        Returns
+        -------
+        numpy.ndarray
+            Parameter value of each block of each retained sample and chain,
+            of shape (blocks, ...). The blocks are ordered by sample, then by
+            chain, then by time.
+        numpy.ndarray
+            Boolean array of shape (samples, chains, time), True at the first
+            time point of each block. The assignments to regimes are its
+            cumulative sum over time minus one.
+        numpy.ndarray
+            Number of regimes, of shape (samples, chains)
+        """
+        if num_mcmc_samples == 0 and Rhat_thresh == 0:
+            raise ValueError('Must provide stopping criteria')
+
+        if thin < 1 or burn_in < 0:
+            raise ValueError('thin must be positive and burn_in non-negative')
+
+        # Set maximum number of MCMC samplers if using Rhat
+        if num_mcmc_samples == 0:
+            num_mcmc_samples = max_mcmc
+
+        if Rhat_thresh != 0:
+            # Set the first half of the chains to start at 1 block
+            # Set the second half of the chains to start at T blocks
+            half = self.num_chains // 2
+            self.changepoints[:half] = False
+            self.changepoints[:half, 0] = True
+            self.changepoints[half:] = True
+
+        samples = collections.deque()
+        rhat_window = collections.deque()
+
+        for iter in range(num_mcmc_samples):
+            self._split_merge_step()
+            for _ in range(5):
+                self._shuffle_step()
+            params = self._sample_change_params()
+            num_blocks = self.changepoints.sum(axis=1)
+
+            if iter >= burn_in and (iter - burn_in) % thin == 0:
+                samples.append(
+                    (iter, params, self.changepoints.copy(), num_blocks))
+
+            if keep_last_half:
+                while samples and samples[0][0] < iter//2:
+                    samples.popleft()
+
+            if Rhat_thresh != 0:
+                rhat_window.append(num_blocks)
+                if len(rhat_window) > iter + 1 - iter//2:
+                    rhat_window.popleft()
+
+            if Rhat_thresh != 0 and iter > 10 and iter%50 == 0:
+                # Check if converged
+                rhat = pints.rhat(np.asarray(rhat_window).T)
+                if progress:
+                    print('Iter={}, Rhat={}'.format(iter, rhat))
+                if rhat < Rhat_thresh:
+                    print('Converged', iter, rhat)
+                    break
+
+        shape = (self.num_chains, self.num_time_pts)
+        if not samples:
+            return np.empty(0), \
+                np.empty((0,) + shape, dtype=bool), \
+                np.empty((0, self.num_chains), dtype=int)
+
+        _, params, changepoints, num_blocks = zip(*samples)
+        return np.concatenate(params), np.stack(changepoints), \
+            np.stack(num_blocks)
@@ -0,0 +1,354 @@
+"""Command line batch runner, fitting a directory of case series.
+
+Each series is a CSV file with a header row and a column named cases (and
+optionally imported_cases), or an NPZ file with arrays cases and optionally
+imported_cases and serial_interval. Series without their own serial interval
+use the one given by --serial-interval. Each series is named after its file
+without the extension, so these names must be unique.
+
+For each series, the output directory receives:
+
+    <name>.npz
+        Compact MCMC trace of the retained samples, readable with load_trace
+    <name>.summary.csv
+        Posterior median and 95% interval of R(t), and the posterior
+        probability of a changepoint on each day
+    <name>.json
+        Hash of the inputs and settings, and the time taken
+
+Series whose inputs and settings are unchanged since the last run are skipped.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+import epicluster as ec
+
+MODELS = {
+    'poisson': 'PoissonModel',
+    'negative-binomial': 'NegativeBinomialModel',
+}
+
+
+def read_serial_interval(path):
+    """Read a serial interval from an NPZ file, or a text file with one value
+    per line.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return np.asarray(data['serial_interval'], dtype=float)
+    return np.loadtxt(path, delimiter=',', ndmin=1)
+
+
+def read_series(path):
+    """Read a case series from a CSV or NPZ file.
+
+    Returns
+    -------
+    dict
+        Arrays of cases, and of imported_cases and serial_interval if present
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return {key: np.asarray(data[key]) for key in data.files}
+
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows or 'cases' not in rows[0]:
+        raise ValueError('{} has no cases column'.format(path))
+
+    series = {'cases': np.array([int(row['cases']) for row in rows])}
+    if 'imported_cases' in rows[0]:
+        series['imported_cases'] = np.array(
+            [int(row['imported_cases']) for row in rows])
+    return series
+
+
+def input_hash(path, serial_interval, settings):
+    """Hash of the contents of a series file, the serial interval used for it
+    and the fit settings.
+
+    The given serial interval is only included for series without their own,
+    whose serial interval is part of the file contents.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            if 'serial_interval' in data.files:
+                serial_interval = None
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        h.update(f.read())
+    if serial_interval is not None:
+        h.update(np.asarray(serial_interval, dtype=float).tobytes())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def save_trace(path, params_chain, assign_chain, num_chains):
+    """Save MCMC output compactly.
+
+    The assignments are stored as bit-packed changepoint indicators, and the
+    parameters as a flat array of the value in each block.
+    """
+    assignments = np.asarray(assign_chain)
+    changepoints = np.ones(assignments.shape, dtype=bool)
+    changepoints[:, 1:] = assignments[:, 1:] != assignments[:, :-1]
+
+    np.savez_compressed(
+        path,
+        num_chains=num_chains,
+        num_time_pts=assignments.shape[1],
+        changepoints=np.packbits(changepoints, axis=1),
+        params=np.concatenate(
+            [np.ravel(p) for p in params_chain]).astype(np.float32))
+
+
+def load_trace(path):
+    """Load MCMC output saved by the batch runner.
+
+    Returns
+    -------
+    numpy.ndarray
+        R(t) of shape (samples, chains, time)
+    numpy.ndarray
+        Block assignments of shape (samples, chains, time)
+    """
+    with np.load(path) as data:
+        num_chains = int(data['num_chains'])
+        num_time_pts = int(data['num_time_pts'])
+        changepoints = np.unpackbits(
+            data['changepoints'], axis=1, count=num_time_pts).astype(bool)
+        params = data['params']
+
+    assignments = np.cumsum(changepoints, axis=1) - 1
+
+    # Position of the first block of each sample within the flat parameters
+    offsets = np.concatenate(([0], np.cumsum(changepoints.sum(axis=1))[:-1]))
+    r = params[offsets[:, np.newaxis] + assignments]
+
+    shape = (-1, num_chains, num_time_pts)
+    return r.reshape(shape), assignments.reshape(shape)
+
+
+def save_summary(path, r, assignments):
+    """Save posterior summaries of R(t) and changepoint locations as CSV.
+    """
+    lower, median, upper = np.percentile(r, [2.5, 50, 97.5], axis=0)
+    changepoints = np.zeros(assignments.shape, dtype=bool)
+    changepoints[:, 1:] = assignments[:, 1:] != assignments[:, :-1]
+    prob_change = changepoints.mean(axis=0)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['t', 'R_median', 'R_lower', 'R_upper',
+                         'changepoint_probability'])
+        for t in range(r.shape[1]):
+            writer.writerow([t, median[t], lower[t], upper[t],
+                             prob_change[t]])
+
+
+def fit_series(task):
+    """Fit one series and write its outputs.
+
+    Parameters
+    ----------
+    task : dict
+        Name, input path, output directory, serial interval, settings and
+        input hash of the series
+
+    Returns
+    -------
+    str
+        Name of the series
+    float
+        Time taken in seconds
+    """
+    t0 = time.perf_counter()
+    settings = task['settings']
+
+    # Seed each series independently of the order in which it is run, within
+    # the range accepted by numpy
+    seed = (int(task['hash'][:8], 16) ^ settings['seed']) % 2**32
+    random.seed(seed)
+    np.random.seed(seed)
+
+    series = read_series(task['path'])
+    serial_interval = series.get('serial_interval', task['serial_interval'])
+    if serial_interval is None:
+        raise ValueError(
+            '{} has no serial interval, and none was given'.format(
+                task['path']))
+
+    kwargs = {}
+    if 'imported_cases' in series:
+        kwargs['imported_cases'] = series['imported_cases'].tolist()
+    if settings['model'] == 'negative-binomial':
+        kwargs['overdispersion'] = settings['overdispersion']
+    model = getattr(ec, MODELS[settings['model']])(
+        series['cases'].tolist(),
+        np.asarray(serial_interval, dtype=float).tolist(),
+        epsilon=settings['epsilon'],
+        prior_expected_clusters=settings['prior_expected_clusters'],
+        **kwargs)
+
+    sampler = ec.MCMCSampler(model, settings['chains'])
+    params_chain, assign_chain, _ = sampler.run_mcmc(
+        num_mcmc_samples=settings['iterations'],
+        Rhat_thresh=settings['rhat'],
+        max_mcmc=settings['max_iterations'],
+        burn_in=settings['burn_in'] or 0,
+        thin=settings['thin'],
+        keep_last_half=settings['burn_in'] is None)
+
+    out = os.path.join(task['output_dir'], task['name'])
+    save_trace(out + '.npz', params_chain, assign_chain, settings['chains'])
+
+    r, assignments = load_trace(out + '.npz')
+    save_summary(out + '.summary.csv',
+                 r.reshape(-1, r.shape[2]),
+                 assignments.reshape(-1, assignments.shape[2]))
+
+    elapsed = time.perf_counter() - t0
+    with open(out + '.json', 'w') as f:
+        json.dump({'hash': task['hash'],
+                   'settings': settings,
+                   'num_samples': len(params_chain),
+                   'time_s': elapsed}, f, indent=2)
+
+    return task['name'], elapsed
+
+
+def is_unchanged(output_dir, name, digest):
+    """Whether the outputs of a series exist and came from the same inputs.
+    """
+    out = os.path.join(output_dir, name)
+    if not all(os.path.exists(out + ext)
+               for ext in ['.npz', '.summary.csv', '.json']):
+        return False
+    try:
+        with open(out + '.json') as f:
+            return json.load(f)['hash'] == digest
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='epicluster-fit',
+        description='Fit the changepoint model to a directory of case series.')
+    parser.add_argument('input_dir',
+                        help='Directory of CSV or NPZ case series')
+    parser.add_argument('output_dir', help='Directory for the outputs')
+    parser.add_argument('--serial-interval', default=None,
+                        help='Serial interval for series without their own, '
+                             'as NPZ or one value per line')
+    parser.add_argument('--model', choices=list(MODELS), default='poisson')
+    parser.add_argument('--overdispersion', type=float, default=10.0,
+                        help='Negative binomial dispersion parameter')
+    parser.add_argument('--epsilon', type=float, default=1.0,
+                        help='Relative transmission risk of imported cases')
+    parser.add_argument('--prior-expected-clusters', type=float,
+                        default=None)
+    parser.add_argument('--chains', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=1000,
+                        help='Number of MCMC iterations, if not using Rhat')
+    parser.add_argument('--rhat', type=float, default=0,
+                        help='Stop once Rhat of the number of blocks is '
+                             'below this value')
+    parser.add_argument('--max-iterations', type=int, default=10000,
+                        help='Maximum iterations when using Rhat')
+    parser.add_argument('--burn-in', type=int, default=None,
+                        help='Number of initial iterations to discard '
+                             '(default: keep only the second half)')
+    parser.add_argument('--thin', type=int, default=1,
+                        help='Keep every thin-th iteration after burn in')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of processes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true',
+                        help='Refit series whose inputs are unchanged')
+    args = parser.parse_args(argv)
+
+    settings = {
+        'model': args.model,
+        'overdispersion': args.overdispersion,
+        'epsilon': args.epsilon,
+        'prior_expected_clusters': args.prior_expected_clusters,
+        'chains': args.chains,
+        'iterations': 0 if args.rhat else args.iterations,
+        'rhat': args.rhat,
+        'max_iterations': args.max_iterations,
+        'burn_in': args.burn_in,
+        'thin': args.thin,
+        'seed': args.seed,
+    }
+
+    serial_interval = None
+    if args.serial_interval is not None:
+        serial_interval = read_serial_interval(args.serial_interval)
+
+    # The outputs of each series are named after its file without the
+    # extension, so two files of the same name would overwrite each other
+    filenames = [filename for filename in sorted(os.listdir(args.input_dir))
+                 if os.path.splitext(filename)[1] in ('.csv', '.npz')]
+    names = [os.path.splitext(filename)[0] for filename in filenames]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        parser.error('series names must be unique, but found both CSV and '
+                     'NPZ files named {}'.format(', '.join(duplicates)))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    tasks = []
+    for filename, name in zip(filenames, names):
+        path = os.path.join(args.input_dir, filename)
+        digest = input_hash(path, serial_interval, settings)
+        if not args.force and is_unchanged(args.output_dir, name, digest):
+            print('{}: unchanged, skipped'.format(name))
+            continue
+        tasks.append({'name': name,
+                      'path': path,
+                      'output_dir': args.output_dir,
+                      'serial_interval': serial_interval,
+                      'settings': settings,
+                      'hash': digest})
+
+    t0 = time.perf_counter()
+    failed = 0
+    if args.workers == 1:
+        for task in tasks:
+            failed += _report(task, fit_series)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+            futures = {pool.submit(fit_series, task): task for task in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                failed += _report(futures[future], lambda _: future.result())
+
+    print('Fitted {} series in {:.2f} s ({} failed)'.format(
+        len(tasks) - failed, time.perf_counter() - t0, failed))
+
+    return 1 if failed else 0
+
+
+def _report(task, run):
+    """Run a task and print its timing, returning 1 if it failed.
+    """
+    try:
+        name, elapsed = run(task)
+    except Exception as e:
+        print('{}: failed: {}'.format(task['name'], e), file=sys.stderr)
+        return 1
+    print('{}: fitted in {:.2f} s'.format(name, elapsed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
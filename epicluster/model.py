@@ -1,16 +1,105 @@
 """Bayesian nonparametric model of changepoints.
 
 It does not include any particular likelihood. Rather, the marginal likelihood
-must be implemented by subclasses.
+must be implemented by subclasses, in one of two ways:
+
+- _segment_marginal_likelihoods and _sample_change_params, giving the log
+  marginal likelihood and a draw of the parameter within each of a set of
+  blocks. The MCMC proposals then evaluate only the blocks they change, and
+  the BatchedMCMCSampler can be used.
+- marginal_likelihood and update_change_params, for the whole assignments.
+  The MCMC proposals then evaluate the posterior of the current and proposed
+  assignments in full.
 """
 
 import math
 import copy
 import random
+import bisect
+import collections
 import numpy as np
 import epicluster as ec
 
 
+class SegmentCache:
+    """Bounded least recently used cache of block log marginal likelihoods.
+
+    Values are keyed by the (start, end) time indices of the block. The
+    MCMCSampler gives all of the chains created from one model this same
+    cache.
+
+    The cached values also depend on the likelihood hyperparameters of the
+    model. These are passed to each lookup, and the cache is cleared whenever
+    they differ from those of the previous lookup.
+
+    Parameters
+    ----------
+    maxsize : int, optional (100000)
+        Maximum number of blocks to store. The least recently used values are
+        discarded first.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = collections.OrderedDict()
+        self._hyperparameters = None
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        """Remove all stored values.
+        """
+        self._values.clear()
+
+    def lookup(self, starts, ends, compute, hyperparameters=()):
+        """Get the values for a set of blocks, computing any which are missing.
+
+        Parameters
+        ----------
+        starts : numpy.ndarray
+            Index of the first time point in each block
+        ends : numpy.ndarray
+            Index one past the last time point in each block
+        compute : callable
+            Function taking arrays of starts and ends and returning the array
+            of values for those blocks
+        hyperparameters : tuple, optional
+            Likelihood hyperparameters with which compute evaluates the blocks
+
+        Returns
+        -------
+        numpy.ndarray
+            Value for each block
+        """
+        if hyperparameters != self._hyperparameters:
+            self.clear()
+            self._hyperparameters = hyperparameters
+
+        values = np.empty(len(starts))
+        missing = []
+        for i, key in enumerate(zip(starts.tolist(), ends.tolist())):
+            value = self._values.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                self._values.move_to_end(key)
+                values[i] = value
+
+        self.hits += len(starts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            values[missing] = compute(starts[missing], ends[missing])
+            for i in missing:
+                self._values[(int(starts[i]), int(ends[i]))] = values[i]
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+        return values
+
+
 class ChangepointProcess:
     """Change point process including MCMC proposals.
 
@@ -26,11 +115,27 @@ class ChangepointProcess:
     For two, equally sized clusters of three time points:
     self.assignments = [0, 0, 0, 1, 1, 1]
     self.change_params = [1.5, 0.5]
+
+    Notes
+    -----
+    The blocks are also indexed by their start offsets, and the start offsets
+    of the blocks with more than one member. The MCMC proposals read and update
+    this index, using bisection rather than scanning the assignments, and
+    evaluate only the change in the posterior due to the blocks they alter.
+    The assignments list is rebuilt from the index when it is next accessed.
+    Assigning a new list to self.assignments stores a copy of it and rebuilds
+    the index.
     """
+    # Attributes which the chains of an MCMCSampler share rather than copy
+    _shared_attributes = ('segment_cache',)
+
     def __init__(self, hyper_sigma=0.5, hyper_theta=0):
         self.hyper_sigma = hyper_sigma
         self.hyper_theta = hyper_theta
         self.q = 0.5
+        self.assignments = []
+        self.change_params = []
+        self.segment_cache = SegmentCache()
 
     def set_initial_blocks(self, num_time_pts, num_blocks):
         """Initialize the block configuration.
@@ -58,13 +163,114 @@ class ChangepointProcess:
 
         self.change_params = copy.deepcopy(phi)
 
-    def marginal_likelihood(self):
-        """The marginal probability of the data conditional on assignments.
+    @property
+    def assignments(self):
+        if self._assignments is None:
+            sizes = np.diff(self._starts + [self._num_time_pts])
+            self._assignments = \
+                np.repeat(np.arange(len(sizes)), sizes).tolist()
+        return self._assignments
+
+    @assignments.setter
+    def assignments(self, z):
+        self._assignments = list(z)
+
+        # Rebuild the index of blocks
+        z = np.asarray(z)
+        change = np.flatnonzero(z[1:] != z[:-1]) + 1
+        starts = np.concatenate(([0], change))
+        ends = np.append(change, len(z))
+
+        self._num_time_pts = len(z)
+        self._starts = starts.tolist()
+        self._splittable = starts[ends - starts > 1].tolist()
+
+    @property
+    def num_blocks(self):
+        """Number of blocks in the current assignments.
+        """
+        return len(self._starts)
+
+    def _block_bounds(self):
+        """Find the time indices delimiting each block.
+
+        Returns
+        -------
+        numpy.ndarray
+            Index of the first time point in each block
+        numpy.ndarray
+            Index one past the last time point in each block
+        """
+        starts = np.array(self._starts)
+        ends = np.append(starts[1:], self._num_time_pts)
+        return starts, ends
+
+    def _block_size(self, j):
+        """Number of time points in block j.
+        """
+        if j + 1 < len(self._starts):
+            return self._starts[j+1] - self._starts[j]
+        return self._num_time_pts - self._starts[j]
+
+    def _update_splittable(self, start, size):
+        """Record whether the block starting at start can be split.
+        """
+        i = bisect.bisect_left(self._splittable, start)
+        present = i < len(self._splittable) and self._splittable[i] == start
+
+        if present and size <= 1:
+            del self._splittable[i]
+        elif not present and size > 1:
+            self._splittable.insert(i, start)
+
+    def _segment_marginal_likelihoods(self, starts, ends):
+        """The log marginal probability of the data within each of a set of
+        blocks.
 
         The change parameters should be integrated out.
+
+        Parameters
+        ----------
+        starts : numpy.ndarray
+            Index of the first time point in each block
+        ends : numpy.ndarray
+            Index one past the last time point in each block
+
+        Returns
+        -------
+        numpy.ndarray
+            Log marginal likelihood of each block
         """
         raise NotImplementedError
 
+    def _likelihood_hyperparameters(self):
+        """The hyperparameters on which _segment_marginal_likelihoods depends,
+        other than the data.
+
+        Returns
+        -------
+        tuple
+            Hyperparameter values
+        """
+        return ()
+
+    def marginal_likelihood(self):
+        """The marginal probability of the data conditional on assignments.
+
+        This is the sum over blocks of the values given by
+        _segment_marginal_likelihoods, reusing previously computed blocks
+        from the segment cache.
+
+        Returns
+        -------
+        float
+            Log marginal likelihood
+        """
+        starts, ends = self._block_bounds()
+        return math.fsum(self.segment_cache.lookup(
+            starts, ends, self._segment_marginal_likelihoods,
+            self._likelihood_hyperparameters()))
+
     def posterior(self):
         """Evaluate the product of the marginal likelihood and the prior over
         regime configurations.
@@ -79,29 +285,126 @@ class ChangepointProcess:
             self.assignments, self.hyper_sigma, self.hyper_theta)
         return p
 
+    def _sample_change_params(self, starts, ends):
+        """Draw the parameter value within each of a set of blocks from its
+        posterior.
+
+        Parameters
+        ----------
+        starts : numpy.ndarray
+            Index of the first time point in each block
+        ends : numpy.ndarray
+            Index one past the last time point in each block
+
+        Returns
+        -------
+        numpy.ndarray
+            Parameter value of each block, indexed by block on the first axis
+        """
+        raise NotImplementedError
+
     def update_change_params(self):
         """Update the parameter values conditional on the current assignments.
         """
-        raise NotImplementedError
+        starts, ends = self._block_bounds()
+        self.change_params = \
+            self._sample_change_params(starts, ends).tolist()
+
+    def _log_posterior_change(self, removed, added):
+        """Change in the log posterior when some blocks are replaced by others.
+
+        Parameters
+        ----------
+        removed : list of tuple
+            (start, end) of the current blocks which are removed
+        added : list of tuple
+            (start, end) of the blocks which replace them
+
+        Returns
+        -------
+        float
+            Log posterior of the new assignments minus that of the current
+            assignments
+        """
+        cls = type(self)
+        if cls._segment_marginal_likelihoods \
+                is ChangepointProcess._segment_marginal_likelihoods \
+                and cls.marginal_likelihood \
+                is not ChangepointProcess.marginal_likelihood:
+            return self._full_posterior_change(removed, added)
+
+        blocks = removed + added
+        mll = self.segment_cache.lookup(
+            np.array([b[0] for b in blocks]),
+            np.array([b[1] for b in blocks]),
+            self._segment_marginal_likelihoods,
+            self._likelihood_hyperparameters())
+
+        p = math.fsum(mll[len(removed):]) - math.fsum(mll[:len(removed)])
+        p += ec.RestrictedPYEPPF().change(
+            len(self._starts),
+            [end - start for start, end in removed],
+            [end - start for start, end in added],
+            self.hyper_sigma,
+            self.hyper_theta)
+        return p
+
+    def _full_posterior_change(self, removed, added):
+        """Change in the log posterior when some blocks are replaced by others,
+        found by evaluating the posterior of the current and the new
+        assignments.
+
+        This is used by subclasses which implement marginal_likelihood rather
+        than _segment_marginal_likelihoods. The current assignments are
+        restored afterwards.
+        """
+        index = (self._starts, self._splittable, self._assignments)
+        p_old = self.posterior()
+
+        starts = set(self._starts) - {start for start, _ in removed} \
+            | {start for start, _ in added}
+        sizes = np.diff(sorted(starts) + [self._num_time_pts])
+        self.assignments = np.repeat(np.arange(len(sizes)), sizes).tolist()
+        p_new = self.posterior()
+
+        self._starts, self._splittable, self._assignments = index
+        return p_new - p_old
+
+    def _split_prob(self, k):
+        """Probability of proposing a split rather than a merge with k blocks.
+        """
+        if k == 1:
+            return 1.0
+        if k < self._num_time_pts:
+            return self.q
+        return 0.0
+
+    def _merge_prob(self, k):
+        """Probability of proposing a merge rather than a split with k blocks.
+        """
+        if k == 1:
+            return 0.0
+        return 1 - self._split_prob(k)
 
     def run_mcmc_step(self, progress=False):
         """Run one MCMC step to generate samples from the posterior.
         """
-        k = len(set(self.assignments))
+        k = self.num_blocks
         if progress:
             print(k)
             print(self.change_params)
             print('\n')
 
         # Randomly choose either split or merge
-        if (k == 1 or random.random() < self.q) and k < len(self.cases):
+        if (k == 1 or random.random() < self.q) \
+                and k < self._num_time_pts:
             self._split_step()
 
         else:
             self._merge_step()
 
         # Recalculate k in case it changed in this iteration
-        k = len(set(self.assignments))
+        k = self.num_blocks
 
         # Shuffle if possible
         if k > 1:
@@ -113,127 +416,92 @@ class ChangepointProcess:
     def _split_step(self):
         """Propose a split, and accept or reject it.
         """
-        k = len(set(self.assignments))
-        z = copy.deepcopy(self.assignments)
-        phi = copy.deepcopy(self.change_params)
+        k = self.num_blocks
 
-        # Get all blocks with greater than 1 member
-        splittable_blocks = \
-            [block_idx for block_idx in set(z) if z.count(block_idx) > 1]
-
-        # Choose a random one of those blocks
-        j = random.choice(splittable_blocks)
+        # Choose a random block with more than one member
+        ngk = len(self._splittable)
+        start = random.choice(self._splittable)
+        j = bisect.bisect_left(self._starts, start)
+        ns = self._block_size(j)
+        end = start + ns
 
         # Choose a random location within that block
-        l = random.randint(1, z.count(j) - 1)
-
-        # Build the proposed split vector
-        j_time_idx = z.index(j)
-        next_time_idx = j_time_idx + z.count(j)
-        z_prop = z[:j_time_idx].copy()
-        for _ in range(l):
-            z_prop.append(j)
-        for _ in range(z.count(j)-l):
-            z_prop.append(j+1)
-        z_prop += [x + 1 for x in z[next_time_idx:]]
+        l = random.randint(1, ns - 1)
 
         # Calculate acceptance ratio of the proposal
-        p_old = self.posterior()
-
-        self.assignments = z_prop.copy()
+        log_alpha = self._log_posterior_change(
+            [(start, end)], [(start, start + l), (start + l, end)])
 
-        p_prop = self.posterior()
-
-        log_alpha = p_prop - p_old
-
-        if k > 1:
-            log_alpha += math.log(1-self.q) - math.log(self.q)
-            ns = z.count(j)
-            ngk = len(splittable_blocks)
-            log_alpha += math.log(ngk * (ns - 1)) - math.log(k)
+        # The reverse move merges the two new blocks
+        log_alpha += math.log(self._merge_prob(k + 1)) - math.log(k) \
+            - math.log(self._split_prob(k)) + math.log(ngk * (ns - 1))
 
-        elif k == 1:
-            log_alpha += math.log(1-self.q) + math.log(len(self.cases)-1)
-
-        cond = (math.log(random.random()) >= log_alpha)
+        cond = (math.log(random.random()) < log_alpha)
         if cond:
-            self.assignments = copy.deepcopy(z)
+            # Accept the proposal
+            self._starts.insert(j + 1, start + l)
+            self._update_splittable(start, l)
+            self._update_splittable(start + l, ns - l)
+            self._assignments = None
 
     def _merge_step(self):
         """Propose a merge, and accept or reject it.
         """
-        k = len(set(self.assignments))
-        z = copy.deepcopy(self.assignments)
-        phi = copy.deepcopy(self.change_params)
+        k = self.num_blocks
         j = random.randint(0, k-2)
 
-        # Build the proposed merged vector
-        j_time_idx = z.index(j+1)
-        z_prop = copy.deepcopy(z[:j_time_idx])
-        z_prop += [x - 1 for x in z[j_time_idx:]]
+        start = self._starts[j]
+        mid = self._starts[j+1]
+        ns = mid - start
+        ns1 = self._block_size(j + 1)
+        end = mid + ns1
 
         # Calculate acceptance ratio of the proposal
-        p_old = self.posterior()
-        self.assignments = z_prop.copy()
-        p_prop = self.posterior()
-
-        log_alpha = p_prop - p_old
+        log_alpha = self._log_posterior_change(
+            [(start, mid), (mid, end)], [(start, end)])
 
-        if k < len(self.cases):
-            log_alpha += math.log(self.q) - math.log(1-self.q)
-            ns = z.count(j)
-            ns1 = z.count(j+1)
-            ngk1 = len([block_idx for block_idx in set(z_prop)
-                        if z_prop.count(block_idx) > 1])
-            log_alpha += math.log(k-1) - math.log(ngk1 * (ns + ns1 - 1))
+        # The reverse move splits the merged block
+        ngk1 = len(self._splittable) - (ns > 1) - (ns1 > 1) + 1
+        log_alpha += math.log(self._split_prob(k - 1)) \
+            - math.log(ngk1 * (ns + ns1 - 1)) \
+            - math.log(self._merge_prob(k)) + math.log(k - 1)
 
-        elif k == len(self.cases):
-            log_alpha += math.log(self.q) + math.log(len(self.cases)-1)
-
-        cond = (math.log(random.random()) >= log_alpha)
+        cond = (math.log(random.random()) < log_alpha)
         if cond:
-            self.assignments = copy.deepcopy(z)
+            # Accept the proposal
+            del self._starts[j+1]
+            self._update_splittable(mid, 0)
+            self._update_splittable(start, ns + ns1)
+            self._assignments = None
 
     def _shuffle_step(self):
         """Propose a shuffle, and accept or reject it.
         """
-        k = len(set(self.assignments))
-        z = copy.deepcopy(self.assignments)
+        k = self.num_blocks
 
         for _ in range(5):
             # Perform the shuffle step
             # Choose a random block, which is not the last
             i = random.randint(0, k-2)
-            i_time_index = z.index(i)
-            next_time_index = i_time_index + z.count(i) + z.count(i+1)
-
-            ni = z.count(i)
-            ni1 = z.count(i+1)
+            start = self._starts[i]
+            mid = self._starts[i+1]
+            end = mid + self._block_size(i + 1)
 
             # Choose a new point for the change point somewhere within the two
             # blocks
-            j = random.randint(0, ni + ni1 - 2)
-
-            # Build the proposed shuffled assignments
-            z_prop = z[:i_time_index]
-
-            for _ in range(j + 1):
-                z_prop.append(i)
-
-            for _ in range(ni+ni1-j - 1):
-                z_prop.append(i+1)
-
-            z_prop += z[next_time_index:]
-
-            p_old = self.posterior()
-            self.assignments = z_prop.copy()
-            p_prop = self.posterior()
-
-            if not math.isfinite(p_prop):
-                self.assignments = z.copy()
+            j = random.randint(0, end - start - 2)
+            new_mid = start + j + 1
+            if new_mid == mid:
                 continue
 
-            cond = (math.log(random.random()) >= p_prop - p_old)
+            log_alpha = self._log_posterior_change(
+                [(start, mid), (mid, end)], [(start, new_mid), (new_mid, end)])
+
+            cond = (math.log(random.random()) < log_alpha)
             if cond:
-                # Reject the proposal
-                self.assignments = z.copy()
+                # Accept the proposal
+                self._starts[i+1] = new_mid
+                self._update_splittable(mid, 0)
+                self._update_splittable(start, new_mid - start)
+                self._update_splittable(new_mid, end - new_mid)
+                self._assignments = None
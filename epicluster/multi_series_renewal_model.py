@@ -0,0 +1,169 @@
+"""Poisson renewal model for several series sharing changepoints.
+"""
+
+import math
+import numpy as np
+import epicluster as ec
+
+special = ec.lazy_import('scipy.special')
+
+
+class MultiSeriesPoissonModel(ec.ChangepointProcess):
+    """Renewal model for local and imported cases in several regions, using
+    the Poisson distribution.
+
+    All regions share the same block assignments, but each region has its own
+    value of R within each block. The R values have independent gamma priors,
+    so the marginal likelihood of a block is the sum over regions of the
+    conjugate terms of PoissonModel. These are computed for all regions at
+    once from prefix sums over time of the (regions x time) case and
+    transmission potential matrices.
+
+    The change parameters of each block are a list giving R in each region.
+    """
+    def __init__(self,
+                 cases,
+                 serial_interval,
+                 imported_cases=None,
+                 epsilon=1,
+                 hyper_sigma=0.1,
+                 hyper_theta=0,
+                 prior_expected_clusters=None):
+        """
+        Parameters
+        ----------
+        cases : numpy.ndarray
+            Local cases of shape (regions, time), including historical cases
+            prior to the inference interval. Historical cases should be equal
+            in length to the supplied serial interval.
+        serial_interval : list of float
+            Discrete serial interval distribution, shared by all regions
+        imported_cases : numpy.ndarray, optional
+            Imported cases (those infected outside of the region), of the same
+            shape as cases
+        epislon : float, optional (1)
+            Relative risk of onwards tranmission for imported cases compared
+            to local cases
+        hyper_sigma : float
+            Hyperparameter sigma of the EPPF
+        hyper_theta : float
+            Hyperparameter theta of the EPPF
+        prior_expected_clusters : float
+            If supplied, chooses hyper_sigma such that the prior mean on number
+            of clusters is equal to this value
+        """
+        super().__init__(hyper_sigma, hyper_theta)
+
+        self.all_cases = np.atleast_2d(np.asarray(cases))
+        self.imported_cases = imported_cases
+        self.epsilon = epsilon
+        self.serial_interval = serial_interval
+
+        self.cases = self.all_cases[:, len(serial_interval):]
+        self.num_series, num_time_pts = self.cases.shape
+        self.set_initial_blocks(num_time_pts, 1)
+
+        self._calculate_lambdas()
+
+        self.r_prior_alpha = 1.0
+        self.r_prior_beta = 1/5.0
+
+        if prior_expected_clusters is not None:
+            self._set_sigma(prior_expected_clusters)
+
+    def set_initial_blocks(self, num_time_pts, num_blocks):
+        super().set_initial_blocks(num_time_pts, num_blocks)
+        self.change_params = [[1.0] * self.num_series
+                              for _ in self.change_params]
+
+    def _set_sigma(self, expected_clusters):
+        """Set sigma such that the prior mean is given by expected_clusters.
+        """
+        prior = ec.RestrictedPYEPPF()
+        self.hyper_sigma = prior.find_prior_hyperparam(
+            len(self.assignments), num_blocks=expected_clusters)
+
+    def _calculate_lambdas(self):
+        """Calculate the tranmission potential for each region and day.
+        """
+        past = len(self.serial_interval)
+
+        infectious = self.all_cases.astype(float)
+        if self.imported_cases is not None:
+            infectious = infectious + self.epsilon \
+                * np.atleast_2d(np.asarray(self.imported_cases, dtype=float))
+
+        # Each window holds the cases of the serial interval preceding a day
+        windows = np.lib.stride_tricks.sliding_window_view(
+            infectious[:, :-1], past, axis=1)
+        self.precalc_lambdas = \
+            windows @ np.asarray(self.serial_interval, dtype=float)[::-1]
+
+        cases = self.cases.astype(float)
+        with np.errstate(divide='ignore'):
+            ll_terms = np.where(
+                self.precalc_lambdas > 0,
+                cases * np.log(self.precalc_lambdas)
+                - special.gammaln(cases + 1),
+                0.0)
+
+        # Prefix sums over time, so that the totals within any block can be
+        # found from its first and last time points
+        self._cum_cases = np.zeros((self.num_series, cases.shape[1] + 1))
+        np.cumsum(cases, axis=1, out=self._cum_cases[:, 1:])
+        self._cum_lambdas = np.zeros_like(self._cum_cases)
+        np.cumsum(self.precalc_lambdas, axis=1, out=self._cum_lambdas[:, 1:])
+
+        # The data terms do not depend on R, so only their total over regions
+        # is needed
+        self._cum_ll_terms = np.concatenate(
+            ([0], np.cumsum(ll_terms.sum(axis=0))))
+
+    def _block_sums(self, starts, ends):
+        """Total cases and transmission potential within each region and block.
+
+        Returns
+        -------
+        numpy.ndarray
+            Sum of cases, of shape (regions, blocks)
+        numpy.ndarray
+            Sum of lambdas, of shape (regions, blocks)
+        """
+        cases_in_block = self._cum_cases[:, ends] - self._cum_cases[:, starts]
+        lambdas_in_block = \
+            self._cum_lambdas[:, ends] - self._cum_lambdas[:, starts]
+        return cases_in_block, lambdas_in_block
+
+    def _likelihood_hyperparameters(self):
+        return self.r_prior_alpha, self.r_prior_beta
+
+    def _segment_marginal_likelihoods(self, starts, ends):
+        a = self.r_prior_alpha
+        b = self.r_prior_beta
+
+        cases_in_block, lambdas_in_block = self._block_sums(starts, ends)
+
+        mll = special.gammaln(a + cases_in_block) \
+            - (a + cases_in_block) * np.log(b + lambdas_in_block)
+
+        return self.num_series * (a * math.log(b) - math.lgamma(a)) \
+            + mll.sum(axis=0) \
+            + self._cum_ll_terms[ends] - self._cum_ll_terms[starts]
+
+    def _sample_change_params(self, starts, ends):
+        """Draw the R value of every region within each block from its gamma
+        posterior.
+
+        Returns
+        -------
+        numpy.ndarray
+            R values of shape (blocks, regions)
+        """
+        a = self.r_prior_alpha
+        b = self.r_prior_beta
+
+        cases_in_block, lambdas_in_block = self._block_sums(starts, ends)
+
+        return np.random.gamma(
+            a + cases_in_block,
+            scale=1/(b+lambdas_in_block)).T
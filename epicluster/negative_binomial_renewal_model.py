@@ -0,0 +1,159 @@
+"""Negative binomial renewal model.
+"""
+
+import numpy as np
+import epicluster as ec
+
+special = ec.lazy_import('scipy.special')
+stats = ec.lazy_import('scipy.stats')
+
+
+class NegativeBinomialModel(ec.PoissonModel):
+    """Renewal model for local and imported cases using the negative binomial
+    distribution.
+
+    The number of cases on each day has mean R times the transmission
+    potential, and variance inflated by the overdispersion parameter. The
+    reproduction number within each block is not conjugate, so it is
+    integrated out numerically on a fixed grid of R values. The log likelihood
+    of every day at every grid value is computed once, and its prefix sums
+    over time give the log likelihood of any block at every grid value in
+    O(grid size) operations. This table is read only, and is shared rather
+    than copied by the chains of an MCMCSampler.
+
+    The gamma prior on R is set through r_prior_alpha and r_prior_beta, as for
+    PoissonModel, and may be changed after construction.
+    """
+    _shared_attributes = ec.PoissonModel._shared_attributes \
+        + ('_cum_grid_ll',)
+
+    def __init__(self,
+                 cases,
+                 serial_interval,
+                 imported_cases=None,
+                 epsilon=1,
+                 overdispersion=10.0,
+                 hyper_sigma=0.1,
+                 hyper_theta=0,
+                 prior_expected_clusters=None,
+                 r_min=1e-3,
+                 r_max=20.0,
+                 num_grid_points=1000):
+        """
+        Parameters
+        ----------
+        cases : list of int
+            Local cases, including historical cases prior to the inference
+            interval. Historical cases should be equal in length to the
+            supplied serial interval.
+        serial_interval : list of float
+            Discrete serial interval distribution
+        imported_cases : list of int, optional
+            Imported cases (those infected outside of the region)
+        epislon : float, optional (1)
+            Relative risk of onwards tranmission for imported cases compared
+            to local cases
+        overdispersion : float, optional (10.0)
+            Dispersion (size) parameter k of the negative binomial. The
+            variance on each day is mu + mu^2 / k, recovering the Poisson
+            model as k goes to infinity.
+        hyper_sigma : float
+            Hyperparameter sigma of the EPPF
+        hyper_theta : float
+            Hyperparameter theta of the EPPF
+        prior_expected_clusters : float
+            If supplied, chooses hyper_sigma such that the prior mean on number
+            of clusters is equal to this value
+        r_min : float, optional (1e-3)
+            Smallest value of R on the integration grid
+        r_max : float, optional (20.0)
+            Largest value of R on the integration grid
+        num_grid_points : int, optional (1000)
+            Number of log-spaced R values on the integration grid
+        """
+        self.overdispersion = overdispersion
+        self.r_grid = np.geomspace(r_min, r_max, num_grid_points)
+
+        super().__init__(cases,
+                         serial_interval,
+                         imported_cases=imported_cases,
+                         epsilon=epsilon,
+                         hyper_sigma=hyper_sigma,
+                         hyper_theta=hyper_theta,
+                         prior_expected_clusters=prior_expected_clusters)
+
+        self._calculate_grid_ll()
+
+    def _calculate_grid_ll(self):
+        """Calculate the log likelihood of each day for every R on the grid.
+
+        Days with zero transmission potential are treated as uninformative,
+        as in the Poisson model.
+        """
+        k = self.overdispersion
+        r = self.r_grid
+        c = np.asarray(self.cases, dtype=float)[:, np.newaxis]
+        mu = np.asarray(self.precalc_lambdas, dtype=float)[:, np.newaxis] * r
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ll = special.gammaln(c + k) - special.gammaln(k) \
+                - special.gammaln(c + 1) \
+                + k * np.log(k / (k + mu)) \
+                + special.xlogy(c, mu / (k + mu))
+        ll[np.asarray(self.precalc_lambdas) <= 0, :] = 0.0
+
+        self._cum_grid_ll = np.zeros((len(self.cases) + 1, len(r)))
+        np.cumsum(ll, axis=0, out=self._cum_grid_ll[1:])
+
+        self._grid_weights_prior = None
+
+    @property
+    def _log_grid_weights(self):
+        """Log quadrature weight of each R on the grid, including the prior
+        density.
+
+        The weights are recalculated when the prior on R has changed.
+        """
+        prior = (self.r_prior_alpha, self.r_prior_beta)
+        if prior != self._grid_weights_prior:
+            # Trapezoidal quadrature weights in log R
+            r = self.r_grid
+            log_r = np.log(r)
+            widths = np.zeros(len(r))
+            widths[1:] += np.diff(log_r) / 2
+            widths[:-1] += np.diff(log_r) / 2
+            self._grid_weights = stats.gamma.logpdf(
+                r, prior[0], scale=1/prior[1]) + log_r + np.log(widths)
+            self._grid_weights_prior = prior
+        return self._grid_weights
+
+    def _block_grid_ll(self, starts, ends):
+        """Log likelihood plus log quadrature weight of each block on the grid.
+        """
+        return self._cum_grid_ll[ends] - self._cum_grid_ll[starts] \
+            + self._log_grid_weights
+
+    def _segment_marginal_likelihoods(self, starts, ends):
+        return special.logsumexp(
+            self._block_grid_ll(starts, ends), axis=1)
+
+    def _sample_change_params(self, starts, ends):
+        """Draw R within each block from its posterior on the grid.
+
+        Each value is drawn uniformly in log R within the grid cell chosen.
+        """
+        log_w = self._block_grid_ll(starts, ends)
+        log_w -= special.logsumexp(log_w, axis=1, keepdims=True)
+
+        # Inverse CDF sampling of the grid index for each block
+        cdf = np.cumsum(np.exp(log_w), axis=1)
+        u = np.random.random(len(starts)) * cdf[:, -1]
+        idx = np.minimum(
+            (cdf < u[:, np.newaxis]).sum(axis=1), len(self.r_grid) - 1)
+
+        log_r = np.log(self.r_grid)
+        half_width = np.diff(log_r).mean() / 2
+        log_r = log_r[idx] + np.random.uniform(
+            -half_width, half_width, len(starts))
+
+        return np.exp(log_r)
@@ -4,9 +4,10 @@
 import math
 import numpy as np
 import copy
-import scipy.special
 import epicluster as ec
 
+special = ec.lazy_import('scipy.special')
+
 
 class PoissonModel(ec.ChangepointProcess):
     """Renewal model for local and imported cases using the Poisson
@@ -76,7 +77,7 @@ class PoissonModel(ec.ChangepointProcess):
         for i in range(len(serial_interval), len(self.all_cases)):
             past_cases = copy.deepcopy(self.all_cases[i-past:i])
             if self.imported_cases is not None:
-                past_cases = np.asarray(past_cases)
+                past_cases = np.asarray(past_cases, dtype=float)
                 past_cases += self.epsilon \
                     * np.asarray(self.imported_cases[i - past:i])
 
@@ -89,52 +90,62 @@ class PoissonModel(ec.ChangepointProcess):
         for c, l in zip(self.cases, self.precalc_lambdas):
             if l > 0:
                 self.precalc_ll_terms.append(
-                    c * math.log(l) - scipy.special.loggamma(c +1))
+                    c * math.log(l) - math.lgamma(c +1))
             else:
                 self.precalc_ll_terms.append(0)
 
-    def marginal_likelihood(self):
-        serial_interval = self.serial_interval
-        past = len(serial_interval)
+        # Prefix sums, so that the totals within any block can be found from
+        # its first and last time points
+        self._cum_cases = np.concatenate(
+            ([0], np.cumsum(self.cases, dtype=float)))
+        self._cum_lambdas = np.concatenate(
+            ([0], np.cumsum(self.precalc_lambdas, dtype=float)))
+        self._cum_ll_terms = np.concatenate(
+            ([0], np.cumsum(self.precalc_ll_terms, dtype=float)))
 
-        a = self.r_prior_alpha
-        b = self.r_prior_beta
+    def _block_sums(self, starts, ends):
+        """Total cases and transmission potential within each block.
 
-        mll = 0
-        for block in set(self.assignments):
-            block_start = self.assignments.index(block)
-            block_end = block_start +self.assignments.count(block) -1
+        Parameters
+        ----------
+        starts : numpy.ndarray
+            Index of the first time point in each block
+        ends : numpy.ndarray
+            Index one past the last time point in each block
+
+        Returns
+        -------
+        numpy.ndarray
+            Sum of cases in each block
+        numpy.ndarray
+            Sum of lambdas in each block
+        """
+        cases_in_block = self._cum_cases[ends] - self._cum_cases[starts]
+        lambdas_in_block = self._cum_lambdas[ends] - self._cum_lambdas[starts]
+        return cases_in_block, lambdas_in_block
 
-            cases_in_block = self.cases[block_start:block_end+1]
-            lambdas_in_block = self.precalc_lambdas[block_start:block_end+1]
+    def _likelihood_hyperparameters(self):
+        return self.r_prior_alpha, self.r_prior_beta
 
-            mll += math.log(b**a) \
-                  - scipy.special.loggamma(a) \
-                  + scipy.special.loggamma(a + sum(cases_in_block)) \
-                  + (-a - sum(cases_in_block)) * math.log(b + sum(lambdas_in_block))
+    def _segment_marginal_likelihoods(self, starts, ends):
+        a = self.r_prior_alpha
+        b = self.r_prior_beta
 
-            mll += sum(self.precalc_ll_terms[block_start:block_end+1])
+        cases_in_block, lambdas_in_block = self._block_sums(starts, ends)
 
-        return mll
+        return a * math.log(b) - math.lgamma(a) \
+            + special.gammaln(a + cases_in_block) \
+            - (a + cases_in_block) * np.log(b + lambdas_in_block) \
+            + self._cum_ll_terms[ends] - self._cum_ll_terms[starts]
 
-    def update_change_params(self):
-        """Update change parameters within each block using Gibbs steps.
+    def _sample_change_params(self, starts, ends):
+        """Draw R within each block from its gamma posterior.
         """
-        serial_interval = self.serial_interval
-        past = len(serial_interval)
-
         a = self.r_prior_alpha
         b = self.r_prior_beta
 
-        self.change_params = []
-
-        for block in set(self.assignments):
-            block_start = self.assignments.index(block)
-            block_end = block_start + self.assignments.count(block) -1
-
-            cases_in_block = self.cases[block_start:block_end+1]
-            lambdas_in_block = self.precalc_lambdas[block_start:block_end+1]
+        cases_in_block, lambdas_in_block = self._block_sums(starts, ends)
 
-            self.change_params.append(scipy.stats.gamma.rvs(
-                a + sum(cases_in_block),
-                scale=1/(b+sum(lambdas_in_block))))
+        return np.random.gamma(
+            a + cases_in_block,
+            scale=1/(b+lambdas_in_block))
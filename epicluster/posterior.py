@@ -1,9 +1,12 @@
 """Runs MCMC sampling on models.
 """
 
+import collections
 import copy
 import numpy as np
-import pints
+import epicluster as ec
+
+pints = ec.lazy_import('pints')
 
 
 class MCMCSampler:
@@ -12,21 +15,45 @@ class MCMCSampler:
     def __init__(self, model, num_chains):
         self.models = []
         for _ in range(num_chains):
-            self.models.append(copy.deepcopy(model))
+            # The chains share the cache of block marginal likelihoods, and
+            # any large read only tables of the model, rather than each
+            # copying them
+            shared = [getattr(model, name)
+                      for name in model._shared_attributes]
+            memo = {id(value): value for value in shared}
+            self.models.append(copy.deepcopy(model, memo))
 
     def run_mcmc(self,
                  num_mcmc_samples=0,
                  Rhat_thresh=0,
                  progress=False,
-                 max_mcmc=10000):
+                 max_mcmc=10000,
+                 burn_in=0,
+                 thin=1,
+                 keep_last_half=False):
         """Run one MCMC step to generate samples from the posterior.
 
+        Only the retained samples are stored, so memory use is bounded by the
+        number of retained samples rather than the number of iterations.
+
         Parameters
         ----------
         num_mcmc_samples : int
             The total number of MCMC samples to run
+        Rhat_thresh : float, optional (0)
+            If supplied, stop once Rhat of the number of regimes, over the
+            second half of the iterations, is below this value
         progress : bool, optional (False)
             Whether or not to print iteration number
+        max_mcmc : int, optional (10000)
+            Maximum number of MCMC samples to run when using Rhat_thresh
+        burn_in : int, optional (0)
+            Number of initial iterations to discard
+        thin : int, optional (1)
+            Keep only every thin-th iteration after the burn in
+        keep_last_half : bool, optional (False)
+            Keep only the second half of the iterations, matching the window
+            used for Rhat. Older samples are discarded as sampling proceeds.
 
         Returns
         -------
@@ -40,6 +67,9 @@ class MCMCSampler:
         if num_mcmc_samples == 0 and Rhat_thresh == 0:
             raise ValueError('Must provide stopping criteria')
 
+        if thin < 1 or burn_in < 0:
+            raise ValueError('thin must be positive and burn_in non-negative')
+
         # Set maximum number of MCMC samplers if using Rhat
         if num_mcmc_samples == 0:
             num_mcmc_samples = max_mcmc
@@ -54,24 +84,37 @@ class MCMCSampler:
             for i in range(num_chains//2, num_chains):
                 self.models[i].set_initial_blocks(T, T)
 
-        params_chain = []
-        assign_chain = []
-        blocks_chain = []
+        # Retained samples of each iteration, as (iteration, parameters,
+        # assignments) for all chains
+        samples = collections.deque()
 
-        for iter in range(num_mcmc_samples):
-            params_chain.append([])
-            assign_chain.append([])
-            blocks_chain.append([])
+        # Number of regimes in the second half of the iterations, for Rhat
+        rhat_window = collections.deque()
 
+        for iter in range(num_mcmc_samples):
             for model in self.models:
                 model.run_mcmc_step()
-                params_chain[-1].append(copy.deepcopy(model.change_params))
-                assign_chain[-1].append(copy.deepcopy(model.assignments))
-                blocks_chain[-1].append(len(set(model.assignments)))
+
+            if iter >= burn_in and (iter - burn_in) % thin == 0:
+                samples.append((
+                    iter,
+                    [copy.deepcopy(model.change_params)
+                     for model in self.models],
+                    [list(model.assignments) for model in self.models]))
+
+            if keep_last_half:
+                while samples and samples[0][0] < iter//2:
+                    samples.popleft()
+
+            if Rhat_thresh != 0:
+                rhat_window.append(
+                    [model.num_blocks for model in self.models])
+                if len(rhat_window) > iter + 1 - iter//2:
+                    rhat_window.popleft()
 
             if Rhat_thresh != 0 and iter > 10 and iter%50 == 0:
                 # Check if converged
-                rhat = pints.rhat(np.asarray(blocks_chain).T[:, iter//2:])
+                rhat = pints.rhat(np.asarray(rhat_window).T)
                 if progress:
                     print('Iter={}, Rhat={}'.format(iter, rhat))
                 if rhat < Rhat_thresh:
@@ -79,6 +122,6 @@ class MCMCSampler:
                     break
 
         # return all chains
-        return [z for x in params_chain for z in x], \
-               [z for x in assign_chain for z in x], \
-               [len(set(z)) for x in assign_chain for z in x]
+        return [z for _, x, _ in samples for z in x], \
+               [z for _, _, x in samples for z in x], \
+               [len(set(z)) for _, _, x in samples for z in x]
@@ -2,10 +2,12 @@
 """
 
 import math
-import scipy.special
-import scipy.optimize
+import numpy as np
 import epicluster as ec
 
+optimize = ec.lazy_import('scipy.optimize')
+special = ec.lazy_import('scipy.special')
+
 
 class RestrictedPYEPPF:
     def __init__(self):
@@ -18,7 +20,7 @@ class RestrictedPYEPPF:
         def f(sigma):
             return -num_blocks + math.exp(ec.log_poch(theta + sigma, n) - math.log(sigma) - ec.log_poch(theta+1, n-1)) - theta/sigma
 
-        x = scipy.optimize.root_scalar(
+        x = optimize.root_scalar(
             f, x0=0.5, bracket=[1e-10, 1-1e-10]).root
 
         return x
@@ -62,3 +64,139 @@ class RestrictedPYEPPF:
         p += prod2
 
         return p
+
+    def change(self, k, removed_sizes, added_sizes, sigma, theta):
+        """Evaluate the change in the Prior Log pdf when some blocks are
+        replaced by others covering the same time points.
+
+        Parameters
+        ----------
+        k : int
+            Number of blocks before the change
+        removed_sizes : list of int
+            Number of time points in each block which is removed
+        added_sizes : list of int
+            Number of time points in each block which is added
+        sigma : int
+            Discount prior hyperparameter
+        theta : int
+            Strength prior hyperparameter
+
+        Returns
+        -------
+        float
+            The log prior after the change minus the log prior before it
+        """
+        new_k = k - len(removed_sizes) + len(added_sizes)
+
+        p = math.lgamma(k+1) - math.lgamma(new_k+1)
+        for i in range(k, new_k):
+            p += math.log(theta + i * sigma)
+        for i in range(new_k, k):
+            p -= math.log(theta + i * sigma)
+
+        for n_j in added_sizes:
+            p += ec.log_poch(1-sigma, n_j-1) - math.lgamma(n_j+1)
+        for n_j in removed_sizes:
+            p -= ec.log_poch(1-sigma, n_j-1) - math.lgamma(n_j+1)
+
+        return p
+
+    def batch(self, block_sizes, batch_index, batch_size, sigma, theta):
+        """Evaluate the Prior Log pdf of several assignments at once.
+
+        Parameters
+        ----------
+        block_sizes : numpy.ndarray
+            Number of time points in each block, for all of the assignments
+        batch_index : numpy.ndarray
+            Index of the assignment which each block belongs to
+        batch_size : int
+            Number of assignments
+        sigma : int
+            Discount prior hyperparameter
+        theta : int
+            Strength prior hyperparameter
+
+        Returns
+        -------
+        numpy.ndarray
+            The log of the prior evaluated at each of the assignments
+        """
+        n = np.bincount(batch_index, weights=block_sizes, minlength=batch_size)
+        k = np.bincount(batch_index, minlength=batch_size)
+
+        p = special.gammaln(n + 1) - special.gammaln(k + 1)
+
+        # Cumulative sums of the terms of prod1 over the number of blocks
+        prod1 = np.concatenate(([0, 0], np.cumsum(
+            np.log(theta + np.arange(1, max(k.max(), 1)) * sigma))))
+        p += prod1[k]
+
+        if theta + 1 != 0:
+            p -= special.gammaln(theta + n) - math.lgamma(theta + 1)
+
+        prod2 = -special.gammaln(block_sizes + 1)
+        if 1 - sigma != 0:
+            prod2 += special.gammaln(block_sizes - sigma) \
+                - math.lgamma(1 - sigma)
+        p += np.bincount(batch_index, weights=prod2, minlength=batch_size)
+
+        return p
+
+    def batch_change(self, k, removed_sizes, removed_index, added_sizes,
+                     added_index, sigma, theta):
+        """Evaluate the change in the Prior Log pdf of several assignments at
+        once, when some of their blocks are replaced by others covering the
+        same time points.
+
+        Parameters
+        ----------
+        k : numpy.ndarray
+            Number of blocks of each assignment before the change
+        removed_sizes : numpy.ndarray
+            Number of time points in each block which is removed
+        removed_index : numpy.ndarray
+            Index of the assignment which each removed block belongs to
+        added_sizes : numpy.ndarray
+            Number of time points in each block which is added
+        added_index : numpy.ndarray
+            Index of the assignment which each added block belongs to
+        sigma : int
+            Discount prior hyperparameter
+        theta : int
+            Strength prior hyperparameter
+
+        Returns
+        -------
+        numpy.ndarray
+            The log prior after the change minus the log prior before it, for
+            each assignment
+        """
+        k = np.asarray(k)
+        removed_index = np.asarray(removed_index, dtype=int)
+        added_index = np.asarray(added_index, dtype=int)
+        new_k = k - np.bincount(removed_index, minlength=len(k)) \
+            + np.bincount(added_index, minlength=len(k))
+
+        p = special.gammaln(k + 1) - special.gammaln(new_k + 1)
+
+        # Cumulative sums of the terms of prod1 over the number of blocks
+        max_k = max(k.max(), new_k.max(), 1)
+        prod1 = np.concatenate(([0, 0], np.cumsum(
+            np.log(theta + np.arange(1, max_k) * sigma))))
+        p += prod1[new_k] - prod1[k]
+
+        def prod2(block_sizes):
+            terms = -special.gammaln(block_sizes + 1)
+            if 1 - sigma != 0:
+                terms += special.gammaln(block_sizes - sigma) \
+                    - math.lgamma(1 - sigma)
+            return terms
+
+        p += np.bincount(added_index, weights=prod2(added_sizes),
+                         minlength=len(k))
+        p -= np.bincount(removed_index, weights=prod2(removed_sizes),
+                         minlength=len(k))
+
+        return p
@@ -0,0 +1,118 @@
+"""Simulation of case series from the renewal model.
+
+Many replicate series are generated at once. The renewal equation is stepped
+through time for all replicates together, and the cases on each day are drawn
+in one batch.
+"""
+
+import numpy as np
+
+
+def piecewise_constant_r(values, changepoints, num_time_pts):
+    """Build a reproduction number trajectory which is constant in blocks.
+
+    Parameters
+    ----------
+    values : list of float
+        Value of R in each block
+    changepoints : list of int
+        Time index at which each block after the first begins. It must have
+        one fewer entry than values.
+    num_time_pts : int
+        Total number of time points
+
+    Returns
+    -------
+    numpy.ndarray
+        Value of R at each time point
+    """
+    if len(changepoints) != len(values) - 1:
+        raise ValueError('Must provide one fewer changepoint than values')
+
+    bounds = np.concatenate(([0], changepoints, [num_time_pts])).astype(int)
+    if np.any(np.diff(bounds) <= 0):
+        raise ValueError('Changepoints must be increasing and within the '
+                         'time interval')
+
+    return np.repeat(np.asarray(values, dtype=float), np.diff(bounds))
+
+
+def simulate_renewal(r,
+                     serial_interval,
+                     initial_cases,
+                     num_replicates=1,
+                     imported_cases=None,
+                     epsilon=1,
+                     overdispersion=None,
+                     seed=None):
+    """Simulate local cases from the renewal model.
+
+    The expected number of local cases on each day is R times the transmission
+    potential, as in PoissonModel. Cases are Poisson distributed, or negative
+    binomial if overdispersion is given.
+
+    Parameters
+    ----------
+    r : numpy.ndarray
+        Reproduction number at each time point, either of shape (T,) to use
+        the same trajectory for every replicate or (num_replicates, T)
+    serial_interval : list of float
+        Discrete serial interval distribution
+    initial_cases : int or numpy.ndarray
+        Historical local cases before the simulated interval, either a single
+        number for every day, an array of length equal to the serial
+        interval, or an array of shape (num_replicates, len(serial_interval))
+    num_replicates : int, optional (1)
+        Number of series to simulate
+    imported_cases : numpy.ndarray, optional
+        Imported cases over the historical and simulated interval, of shape
+        (len(serial_interval) + T,) or (num_replicates,
+        len(serial_interval) + T)
+    epislon : float, optional (1)
+        Relative risk of onwards tranmission for imported cases compared to
+        local cases
+    overdispersion : float, optional
+        Dispersion (size) parameter k of the negative binomial, as in
+        NegativeBinomialModel. If None, cases are Poisson distributed.
+    seed : int or numpy.random.Generator, optional
+        Seed or generator for the random draws
+
+    Returns
+    -------
+    numpy.ndarray
+        Local cases of shape (num_replicates, len(serial_interval) + T),
+        including the historical cases. Each row can be passed directly as the
+        cases of a PoissonModel.
+    """
+    rng = np.random.default_rng(seed)
+
+    past = len(serial_interval)
+    r = np.asarray(r, dtype=float)
+    if r.ndim == 1:
+        r = np.broadcast_to(r, (num_replicates, len(r)))
+    if r.shape[0] != num_replicates:
+        raise ValueError('r must have one row for each replicate')
+    num_time_pts = r.shape[1]
+
+    cases = np.zeros((num_replicates, past + num_time_pts), dtype=np.int64)
+    cases[:, :past] = initial_cases
+
+    infectious = cases.astype(float)
+    if imported_cases is not None:
+        infectious += epsilon * np.broadcast_to(
+            np.asarray(imported_cases, dtype=float), cases.shape)
+
+    w = np.asarray(serial_interval, dtype=float)[::-1]
+    for t in range(past, past + num_time_pts):
+        mean = r[:, t - past] * (infectious[:, t - past:t] @ w)
+
+        if overdispersion is None:
+            new_cases = rng.poisson(mean)
+        else:
+            new_cases = rng.negative_binomial(
+                overdispersion, overdispersion / (overdispersion + mean))
+
+        cases[:, t] = new_cases
+        infectious[:, t] += new_cases
+
+    return cases
@@ -0,0 +1,124 @@
+"""Test the code in the module batched_sampler.py.
+"""
+
+import itertools
+import unittest
+import numpy as np
+import epicluster as ec
+
+
+class TestBatchedSampler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Make simple data for testing
+        cls.cases = [1, 2, 3, 4, 5, 6, 2, 1]
+        cls.serial_interval = [0.1, 0.9]
+        cls.imported_cases = [1, 0, 2, 1, 0, 0, 0, 1]
+        cls.model = ec.PoissonModel(cls.cases,
+                                    cls.serial_interval,
+                                    imported_cases=cls.imported_cases,
+                                    hyper_sigma=0.5)
+
+    def all_assignments(self):
+        # Every block configuration of the six time points
+        for bits in itertools.product([0, 1], repeat=5):
+            yield [0] + np.cumsum(bits).tolist()
+
+    def test_init(self):
+        sampler = ec.BatchedMCMCSampler(self.model, 3)
+        self.assertEqual(sampler.changepoints.shape, (3, 6))
+        self.assertTrue(np.all(sampler.changepoints[:, 0]))
+        self.assertFalse(np.any(sampler.changepoints[:, 1:]))
+
+    def test_log_posterior(self):
+        model = ec.PoissonModel(self.cases,
+                                self.serial_interval,
+                                imported_cases=self.imported_cases,
+                                hyper_sigma=0.5)
+        sampler = ec.BatchedMCMCSampler(model, 32)
+
+        zs = np.array(list(self.all_assignments()))
+        changepoints = np.ones(zs.shape, dtype=bool)
+        changepoints[:, 1:] = zs[:, 1:] != zs[:, :-1]
+
+        expected = []
+        for z in zs:
+            model.assignments = z.tolist()
+            expected.append(model.posterior())
+
+        np.testing.assert_allclose(
+            sampler.log_posterior(changepoints), expected)
+
+    def test_run_mcmc(self):
+        sampler = ec.BatchedMCMCSampler(self.model, 4)
+
+        # Check that it fails if no stopping criteria is provided
+        with self.assertRaises(ValueError):
+            sampler.run_mcmc()
+
+        params, changepoints, num_blocks = sampler.run_mcmc(
+            num_mcmc_samples=10, burn_in=2, thin=2)
+        self.assertEqual(changepoints.shape, (4, 4, 6))
+        self.assertEqual(changepoints.dtype, bool)
+        self.assertEqual(num_blocks.shape, (4, 4))
+        self.assertEqual(params.shape, (num_blocks.sum(),))
+        self.assertTrue(np.all(params > 0))
+        np.testing.assert_array_equal(num_blocks, changepoints.sum(axis=2))
+
+        # Check the parameters of each block at each time point
+        r = sampler.expand_params(changepoints, params)
+        self.assertEqual(r.shape, (4, 4, 6))
+        self.assertEqual(r[0, 0, 0], params[0])
+        self.assertEqual(r[-1, -1, -1], params[-1])
+        self.assertEqual(r[0, 1, 0], params[num_blocks[0, 0]])
+
+        # Check with an Rhat threshold (though it will hit the max_mcmc here)
+        params, changepoints, num_blocks = sampler.run_mcmc(
+            Rhat_thresh=1.01, max_mcmc=5, keep_last_half=True)
+        self.assertEqual(changepoints.shape, (3, 4, 6))
+
+    def test_posterior_distribution(self):
+        # The chains should sample the exact posterior over configurations
+        model = ec.PoissonModel(self.cases,
+                                self.serial_interval,
+                                imported_cases=self.imported_cases,
+                                hyper_sigma=0.5)
+        log_post = []
+        for z in self.all_assignments():
+            model.assignments = z
+            log_post.append(model.posterior())
+        expected = np.exp(np.asarray(log_post) - max(log_post))
+        expected /= expected.sum()
+
+        np.random.seed(1)
+        model.assignments = [0] * 6
+        sampler = ec.BatchedMCMCSampler(model, 256)
+        _, changepoints, _ = sampler.run_mcmc(
+            num_mcmc_samples=200, burn_in=20)
+
+        code = changepoints[:, :, 1:].reshape(-1, 5) \
+            @ (2 ** np.arange(5)[::-1])
+        freq = np.bincount(code, minlength=32) / len(code)
+
+        np.testing.assert_allclose(freq, expected, atol=0.01)
+
+    def test_other_models(self):
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         num_grid_points=100)
+        sampler = ec.BatchedMCMCSampler(model, 3)
+        params, changepoints, _ = sampler.run_mcmc(num_mcmc_samples=2)
+        self.assertEqual(
+            sampler.expand_params(changepoints, params).shape, (2, 3, 6))
+
+        model = ec.MultiSeriesPoissonModel([self.cases, self.cases[::-1]],
+                                           self.serial_interval)
+        sampler = ec.BatchedMCMCSampler(model, 3)
+        params, changepoints, _ = sampler.run_mcmc(num_mcmc_samples=2)
+        self.assertEqual(
+            sampler.expand_params(changepoints, params).shape, (2, 3, 6, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
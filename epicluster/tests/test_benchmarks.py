@@ -0,0 +1,49 @@
+"""Test the scripts in the benchmarks directory.
+"""
+
+import importlib.util
+import os
+import unittest
+import numpy as np
+
+BENCHMARKS = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, 'benchmarks')
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(BENCHMARKS, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@unittest.skipUnless(os.path.isdir(BENCHMARKS), 'benchmarks not available')
+class TestBenchSampler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bench = load_script('bench_sampler')
+
+    def test_make_data(self):
+        # Every series of the default grid should stay of a moderate size
+        serial_interval = self.bench.make_serial_interval()
+        for num_time_pts in self.bench.DEFAULT_LENGTHS:
+            for num_blocks in self.bench.DEFAULT_BLOCKS:
+                cases, true_r = self.bench.make_data(
+                    num_time_pts, num_blocks, serial_interval)
+                self.assertEqual(
+                    len(cases), num_time_pts + len(serial_interval))
+                self.assertEqual(len(np.unique(true_r)), min(num_blocks, 2))
+                self.assertLess(max(cases), 10000)
+
+    def test_run_case(self):
+        for batched in [False, True]:
+            r = self.bench.run_case(30, 2, 2, 4, 0, batched=batched)
+            self.assertEqual(r['iterations'], 4)
+            self.assertGreater(r['iterations_per_s'], 0)
+            self.assertGreater(r['peak_memory_mb'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
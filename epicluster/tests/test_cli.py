@@ -0,0 +1,140 @@
+"""Test the code in the module cli.py.
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+from epicluster import cli
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp.name, 'input')
+        self.output_dir = os.path.join(self.tmp.name, 'output')
+        os.makedirs(self.input_dir)
+
+        with open(os.path.join(self.input_dir, 'a.csv'), 'w') as f:
+            f.write('cases,imported_cases\n')
+            for c, i in zip([1, 2, 3, 4, 5, 6], [1, 0, 2, 1, 0, 0]):
+                f.write('{},{}\n'.format(c, i))
+
+        np.savez(os.path.join(self.input_dir, 'b.npz'),
+                 cases=[2, 2, 1, 0, 3, 4, 6],
+                 serial_interval=[0.2, 0.3, 0.5])
+
+        self.serial_interval = os.path.join(self.tmp.name, 'si.txt')
+        with open(self.serial_interval, 'w') as f:
+            f.write('0.1\n0.9\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_main(self, *extra):
+        argv = [self.input_dir, self.output_dir,
+                '--serial-interval', self.serial_interval,
+                '--chains', '2', '--iterations', '6', '--workers', '1']
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            status = cli.main(argv + list(extra))
+        return status, stdout.getvalue()
+
+    def test_main(self):
+        status, out = self.run_main()
+        self.assertEqual(status, 0)
+        self.assertIn('a: fitted', out)
+        self.assertIn('b: fitted', out)
+
+        for name in ['a', 'b']:
+            for ext in ['.npz', '.summary.csv', '.json']:
+                self.assertTrue(os.path.exists(
+                    os.path.join(self.output_dir, name + ext)))
+
+        r, assignments = cli.load_trace(
+            os.path.join(self.output_dir, 'b.npz'))
+        # Only iterations 2 to 5, the Rhat window, are kept by default
+        self.assertEqual(r.shape, (4, 2, 4))
+        self.assertEqual(assignments.shape, (4, 2, 4))
+        self.assertTrue(np.all(r > 0))
+        self.assertTrue(np.all(assignments[:, :, 0] == 0))
+
+        # Unchanged series are skipped
+        status, out = self.run_main()
+        self.assertIn('a: unchanged, skipped', out)
+        self.assertIn('b: unchanged, skipped', out)
+
+        # Changing the settings refits
+        status, out = self.run_main('--iterations', '4')
+        self.assertIn('a: fitted', out)
+
+        # Changing the data refits only that series
+        with open(os.path.join(self.input_dir, 'a.csv'), 'a') as f:
+            f.write('7,0\n')
+        status, out = self.run_main('--iterations', '4')
+        self.assertIn('a: fitted', out)
+        self.assertIn('b: unchanged, skipped', out)
+
+        # Series with their own serial interval do not use --serial-interval
+        with open(self.serial_interval, 'w') as f:
+            f.write('0.2\n0.8\n')
+        status, out = self.run_main('--iterations', '4')
+        self.assertIn('a: fitted', out)
+        self.assertIn('b: unchanged, skipped', out)
+
+    def test_main_seed(self):
+        for seed in ['-1', str(2**32)]:
+            status, out = self.run_main('--seed', seed)
+            self.assertEqual(status, 0)
+            self.assertIn('Fitted 2 series', out)
+
+    def test_main_thinning(self):
+        status, out = self.run_main('--burn-in', '1', '--thin', '2')
+        self.assertEqual(status, 0)
+        r, _ = cli.load_trace(os.path.join(self.output_dir, 'a.npz'))
+        self.assertEqual(r.shape, (3, 2, 4))
+
+    def test_main_process_pool(self):
+        status, out = self.run_main('--workers', '2',
+                                    '--model', 'negative-binomial')
+        self.assertEqual(status, 0)
+        self.assertIn('Fitted 2 series', out)
+
+    def test_duplicate_names(self):
+        np.savez(os.path.join(self.input_dir, 'a.npz'),
+                 cases=[1, 2, 3, 4, 5, 6])
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), \
+                self.assertRaises(SystemExit):
+            self.run_main()
+        self.assertIn('named a', stderr.getvalue())
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_missing_serial_interval(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(stderr):
+            status = cli.main([self.input_dir, self.output_dir,
+                               '--iterations', '2', '--workers', '1'])
+        self.assertEqual(status, 1)
+        self.assertIn('a: failed', stderr.getvalue())
+
+    def test_save_and_load_trace(self):
+        params_chain = [[1.0], [2.0, 3.0], [1.5, 0.5, 2.5], [4.0]]
+        assign_chain = [[0, 0, 0], [0, 0, 1], [0, 1, 2], [0, 0, 0]]
+        path = os.path.join(self.tmp.name, 'trace.npz')
+        cli.save_trace(path, params_chain, assign_chain, 2)
+
+        r, assignments = cli.load_trace(path)
+        self.assertEqual(assignments.reshape(4, 3).tolist(), assign_chain)
+        np.testing.assert_allclose(
+            r.reshape(4, 3),
+            [[1.0, 1.0, 1.0], [2.0, 2.0, 3.0], [1.5, 0.5, 2.5],
+             [4.0, 4.0, 4.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""Test the lazy loading of the package in __init__.py.
+"""
+
+import subprocess
+import sys
+import unittest
+import epicluster as ec
+
+
+class TestInit(unittest.TestCase):
+
+    def test_public_names(self):
+        for name in ec.__all__:
+            self.assertTrue(hasattr(ec, name))
+            self.assertIn(name, dir(ec))
+
+        self.assertIs(ec.PoissonModel, ec.poisson_renewal_model.PoissonModel)
+
+        with self.assertRaises(AttributeError):
+            ec.not_a_name
+
+    def test_import_is_lazy(self):
+        # Use a fresh interpreter, as other tests load the submodules
+        code = ('import sys, epicluster\n'
+                'heavy = ["scipy", "pints", "epicluster.model"]\n'
+                'print(",".join(m for m in heavy if m in sys.modules))\n')
+        loaded = subprocess.run([sys.executable, '-c', code],
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(loaded.stdout.strip(), '')
+
+    def test_lazy_import(self):
+        module = ec.lazy_import('json')
+        self.assertEqual(module.dumps([1]), '[1]')
+
+
+if __name__ == '__main__':
+    unittest.main()
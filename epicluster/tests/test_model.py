@@ -1,12 +1,97 @@
 """Test the code in the module model.py.
 """
 
+import copy
 import math
 import unittest
 from unittest.mock import patch
+import numpy as np
 import epicluster as ec
 
 
+class TestSegmentCache(unittest.TestCase):
+
+    def test_lookup(self):
+        cache = ec.SegmentCache(maxsize=3)
+        calls = []
+
+        def compute(starts, ends):
+            calls.append(len(starts))
+            return (ends - starts).astype(float)
+
+        values = cache.lookup(np.array([0, 2]), np.array([2, 5]), compute)
+        self.assertEqual(values.tolist(), [2.0, 3.0])
+        self.assertEqual(calls, [2])
+
+        # Only the new block should be computed
+        values = cache.lookup(np.array([0, 5]), np.array([2, 9]), compute)
+        self.assertEqual(values.tolist(), [2.0, 4.0])
+        self.assertEqual(calls, [2, 1])
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 3)
+
+        # The least recently used block (2, 5) is evicted
+        cache.lookup(np.array([9]), np.array([10]), compute)
+        self.assertEqual(len(cache), 3)
+        cache.lookup(np.array([2]), np.array([5]), compute)
+        self.assertEqual(calls, [2, 1, 1, 1])
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_hyperparameters(self):
+        cache = ec.SegmentCache()
+
+        def compute(starts, ends):
+            return (ends - starts).astype(float)
+
+        cache.lookup(np.array([0]), np.array([2]), compute, (1.0, 0.2))
+        cache.lookup(np.array([0]), np.array([2]), compute, (1.0, 0.2))
+        self.assertEqual(cache.hits, 1)
+
+        # Values computed with other hyperparameters are discarded
+        cache.lookup(np.array([0]), np.array([2]), compute, (1.0, 2.0))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_copy(self):
+        cache = ec.SegmentCache()
+        cache.lookup(np.array([0]), np.array([2]),
+                     lambda starts, ends: np.zeros(len(starts)))
+        copied = copy.deepcopy(cache)
+        self.assertIsNot(copied, cache)
+        self.assertEqual(len(copied), 1)
+
+
+class FlatModel(ec.ChangepointProcess):
+    """Model whose blocks have a simple likelihood, for testing proposals.
+    """
+    def __init__(self, num_time_pts):
+        super().__init__(0.5, 0)
+        self.set_initial_blocks(num_time_pts, 1)
+
+    def _segment_marginal_likelihoods(self, starts, ends):
+        return -0.1 * (ends - starts) ** 2
+
+    def _sample_change_params(self, starts, ends):
+        return np.ones(len(starts))
+
+
+class WholeModel(ec.ChangepointProcess):
+    """Model implementing the likelihood of the whole assignments only.
+    """
+    def __init__(self, num_time_pts):
+        super().__init__(0.5, 0)
+        self.set_initial_blocks(num_time_pts, 1)
+
+    def marginal_likelihood(self):
+        z = self.assignments
+        return -0.1 * sum(z.count(j) ** 2 for j in set(z))
+
+    def update_change_params(self):
+        self.change_params = [1.0] * len(set(self.assignments))
+
+
 class TestModel(unittest.TestCase):
 
     def test_init(self):
@@ -26,6 +111,83 @@ class TestModel(unittest.TestCase):
         self.assertEqual(model.change_params[0], 1)
         self.assertEqual(len(set(model.change_params)), 1)
 
+    def test_block_index(self):
+        model = ec.ChangepointProcess()
+        model.assignments = [0, 0, 1, 2, 2, 2]
+        self.assertEqual(model.num_blocks, 3)
+        self.assertEqual(model._starts, [0, 2, 3])
+        self.assertEqual(model._splittable, [0, 3])
+        self.assertEqual(model._block_size(2), 3)
+
+        starts, ends = model._block_bounds()
+        self.assertEqual(starts.tolist(), [0, 2, 3])
+        self.assertEqual(ends.tolist(), [2, 3, 6])
+
+        # Later changes to the assigned list do not affect the model
+        z = [0, 0, 1, 1, 1, 1]
+        model.assignments = z
+        z[1] = 1
+        self.assertEqual(model.assignments, [0, 0, 1, 1, 1, 1])
+        self.assertEqual(model._starts, [0, 2])
+
+        # The assignments are rebuilt from the index
+        model._starts = [0, 4]
+        model._assignments = None
+        self.assertEqual(model.assignments, [0, 0, 0, 0, 1, 1])
+
+    def test_proposals_maintain_index(self):
+        model = FlatModel(12)
+        for _ in range(200):
+            model.run_mcmc_step()
+
+            starts = model._starts
+            splittable = model._splittable
+            model.assignments = model.assignments
+            self.assertEqual(starts, model._starts)
+            self.assertEqual(splittable, model._splittable)
+
+    def test_log_posterior_change(self):
+        model = FlatModel(6)
+        model.assignments = [0, 0, 1, 1, 1, 2]
+        old = model.posterior()
+
+        change = model._log_posterior_change(
+            [(0, 2), (2, 5)], [(0, 3), (3, 5)])
+        model.assignments = [0, 0, 0, 1, 1, 2]
+        self.assertAlmostEqual(change, model.posterior() - old)
+
+        old = model.posterior()
+        change = model._log_posterior_change([(0, 3)], [(0, 1), (1, 3)])
+        model.assignments = [0, 1, 1, 2, 2, 3]
+        self.assertAlmostEqual(change, model.posterior() - old)
+
+    def test_whole_marginal_likelihood(self):
+        # Proposals fall back to the full posterior of the assignments
+        model = WholeModel(6)
+        model.assignments = [0, 0, 1, 1, 1, 2]
+        old = model.posterior()
+        change = model._log_posterior_change(
+            [(0, 2), (2, 5)], [(0, 3), (3, 5)])
+        self.assertEqual(model.assignments, [0, 0, 1, 1, 1, 2])
+        self.assertEqual(model._starts, [0, 2, 5])
+
+        model.assignments = [0, 0, 0, 1, 1, 2]
+        self.assertAlmostEqual(change, model.posterior() - old)
+
+        # It should match the same likelihood given block by block
+        flat = FlatModel(6)
+        flat.assignments = [0, 0, 1, 1, 1, 2]
+        self.assertAlmostEqual(
+            change,
+            flat._log_posterior_change([(0, 2), (2, 5)], [(0, 3), (3, 5)]))
+
+        for _ in range(100):
+            model.run_mcmc_step()
+            self.assertEqual(len(model.change_params), model.num_blocks)
+            starts = model._starts
+            model.assignments = model.assignments
+            self.assertEqual(starts, model._starts)
+
     def test_marginal_likelihood(self):
         model = ec.ChangepointProcess()
         with self.assertRaises(NotImplementedError):
@@ -0,0 +1,87 @@
+"""Test the code in the module multi_series_renewal_model.py.
+"""
+
+import math
+import unittest
+import numpy as np
+import epicluster as ec
+
+
+class TestMultiSeriesRenewalModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Make simple data for testing
+        cls.cases = [[1, 2, 3, 4, 5, 6],
+                     [2, 2, 1, 0, 3, 4],
+                     [0, 5, 6, 7, 9, 8]]
+        cls.serial_interval = [0.1, 0.9]
+        cls.imported_cases = [[1, 0, 2, 1, 0, 0],
+                              [0, 0, 0, 1, 1, 0],
+                              [2, 1, 0, 0, 0, 1]]
+
+    def test_init(self):
+        model = ec.MultiSeriesPoissonModel(self.cases,
+                                           self.serial_interval,
+                                           imported_cases=self.imported_cases)
+
+        self.assertEqual(model.num_series, 3)
+        self.assertEqual(model.cases.tolist()[0], [3, 4, 5, 6])
+        self.assertEqual(model.assignments, [0, 0, 0, 0])
+        self.assertEqual(model.change_params, [[1.0, 1.0, 1.0]])
+
+        # Check setting sigma
+        model = ec.MultiSeriesPoissonModel(self.cases,
+                                           self.serial_interval,
+                                           prior_expected_clusters=1.5)
+        self.assertAlmostEqual(
+            model.hyper_sigma,
+            ec.RestrictedPYEPPF().find_prior_hyperparam(4, num_blocks=1.5))
+
+    def test_marginal_likelihood(self):
+        model = ec.MultiSeriesPoissonModel(self.cases,
+                                           self.serial_interval,
+                                           imported_cases=self.imported_cases)
+        single_models = [
+            ec.PoissonModel(c, self.serial_interval, imported_cases=i)
+            for c, i in zip(self.cases, self.imported_cases)]
+
+        # It should equal the sum of the separate models with the same blocks
+        for z in [[0, 0, 0, 0], [0, 0, 1, 1], [0, 1, 2, 3]]:
+            model.assignments = z
+            expected = 0
+            for single_model in single_models:
+                single_model.assignments = z
+                expected += single_model.marginal_likelihood()
+
+            mll = model.marginal_likelihood()
+            self.assertTrue(math.isfinite(mll))
+            self.assertAlmostEqual(mll, expected)
+
+    def test_update_change_params(self):
+        model = ec.MultiSeriesPoissonModel(self.cases,
+                                           self.serial_interval,
+                                           imported_cases=self.imported_cases)
+
+        model.assignments = [0, 0, 1, 1]
+        model.update_change_params()
+
+        # Check that there are two blocks of three R values
+        self.assertEqual(np.shape(model.change_params), (2, 3))
+        self.assertTrue(np.all(np.asarray(model.change_params) > 0))
+
+    def test_run_mcmc(self):
+        model = ec.MultiSeriesPoissonModel(self.cases,
+                                           self.serial_interval,
+                                           imported_cases=self.imported_cases)
+        sampler = ec.MCMCSampler(model, 2)
+        params_chain, assign_chain, clusters_chain = \
+            sampler.run_mcmc(num_mcmc_samples=5)
+
+        self.assertEqual(len(params_chain), 10)
+        for params, clusters in zip(params_chain, clusters_chain):
+            self.assertEqual(np.shape(params), (clusters, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
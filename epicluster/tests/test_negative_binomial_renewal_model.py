@@ -0,0 +1,98 @@
+"""Test the code in the module negative_binomial_renewal_model.py.
+"""
+
+import math
+import unittest
+import epicluster as ec
+
+
+class TestNegativeBinomialRenewalModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Make simple data for testing
+        cls.cases = [1, 2, 3, 4, 5, 6]
+        cls.serial_interval = [0.1, 0.9]
+        cls.imported_cases = [1, 0, 2, 1, 0, 0]
+
+    def test_init(self):
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         imported_cases=self.imported_cases,
+                                         overdispersion=5.0,
+                                         num_grid_points=200)
+
+        self.assertEqual(model.cases, [3, 4, 5, 6])
+        self.assertEqual(model.assignments, [0, 0, 0, 0])
+        self.assertEqual(model.overdispersion, 5.0)
+        self.assertEqual(len(model.r_grid), 200)
+
+    def test_marginal_likelihood(self):
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         imported_cases=self.imported_cases)
+        mll = model.marginal_likelihood()
+        self.assertTrue(math.isfinite(mll))
+
+        # Check that the cached value is reused
+        self.assertEqual(model.marginal_likelihood(), mll)
+
+        # With very little overdispersion, it should match the Poisson model
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         imported_cases=self.imported_cases,
+                                         overdispersion=1e8)
+        poisson_model = ec.PoissonModel(self.cases,
+                                        self.serial_interval,
+                                        imported_cases=self.imported_cases)
+        for z in [[0, 0, 0, 0], [0, 0, 1, 1], [0, 1, 2, 3]]:
+            model.assignments = z
+            poisson_model.assignments = z
+            self.assertAlmostEqual(model.marginal_likelihood(),
+                                   poisson_model.marginal_likelihood(),
+                                   places=4)
+
+    def test_prior(self):
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         imported_cases=self.imported_cases)
+        mll = model.marginal_likelihood()
+
+        # Changing the prior on R after construction should take effect
+        model.r_prior_beta = 2.0
+        self.assertNotAlmostEqual(model.marginal_likelihood(), mll)
+
+        model.r_prior_beta = 1/5.0
+        self.assertAlmostEqual(model.marginal_likelihood(), mll)
+
+    def test_shared_table(self):
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         imported_cases=self.imported_cases)
+        sampler = ec.MCMCSampler(model, 2)
+        for chain in sampler.models:
+            self.assertIs(chain._cum_grid_ll, model._cum_grid_ll)
+
+    def test_update_change_params(self):
+        model = ec.NegativeBinomialModel(self.cases,
+                                         self.serial_interval,
+                                         imported_cases=self.imported_cases)
+
+        model.assignments = [0, 0, 0, 0]
+        model.update_change_params()
+
+        # Check that there is one R value
+        self.assertEqual(len(model.change_params), 1)
+        self.assertTrue(model.change_params[0] > 0)
+
+        model.assignments = [0, 1, 2, 3]
+        model.update_change_params()
+
+        # Check that there are four R values
+        self.assertEqual(len(model.change_params), 4)
+        for r in model.change_params:
+            self.assertTrue(r > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
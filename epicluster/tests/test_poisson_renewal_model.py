@@ -1,6 +1,7 @@
 """Test the code in the module poisson_renewal_model.py.
 """
 
+import copy
 import math
 import unittest
 from unittest.mock import patch
@@ -41,6 +42,22 @@ class TestPoissonRenewalModel(unittest.TestCase):
         mll = model.marginal_likelihood()
         self.assertTrue(math.isfinite(mll))
 
+        # Changing the prior, including on a copy, should not reuse values
+        # cached under the old prior
+        fresh = ec.PoissonModel(self.cases,
+                                self.serial_interval,
+                                imported_cases=self.imported_cases)
+        fresh.r_prior_beta = 2.0
+        copied = copy.deepcopy(model)
+        copied.r_prior_beta = 2.0
+        self.assertAlmostEqual(copied.marginal_likelihood(),
+                               fresh.marginal_likelihood())
+        self.assertEqual(model.marginal_likelihood(), mll)
+
+        model.r_prior_beta = 2.0
+        self.assertAlmostEqual(model.marginal_likelihood(),
+                               fresh.marginal_likelihood())
+
     def test_update_change_params(self):
         model = ec.PoissonModel(self.cases,
                                 self.serial_interval,
@@ -1,9 +1,12 @@
 """Test the code in the module posterior.py.
 """
 
+import itertools
 import math
+import random
 import unittest
 from unittest.mock import patch
+import numpy as np
 import epicluster as ec
 
 
@@ -34,6 +37,10 @@ class TestPosterior(unittest.TestCase):
         # the original assignments
         self.assertEqual(sampler.models[1].assignments, [0, 0, 0, 0])
 
+        # The chains should share one cache of block marginal likelihoods
+        self.assertIs(sampler.models[0].segment_cache,
+                      sampler.models[1].segment_cache)
+
     def test_run_mcmc(self):
         sampler = ec.MCMCSampler(self.model, 2)
 
@@ -58,6 +65,65 @@ class TestPosterior(unittest.TestCase):
         self.assertEqual(len(assign_chain), 10)
         self.assertEqual(len(clusters_chain), 10)
 
+    def test_run_mcmc_retained_samples(self):
+        sampler = ec.MCMCSampler(self.model, 2)
+
+        # Iterations 3, 5, 7 and 9 are kept
+        params_chain, assign_chain, clusters_chain = \
+            sampler.run_mcmc(num_mcmc_samples=10, burn_in=3, thin=2)
+        self.assertEqual(len(params_chain), 8)
+        self.assertEqual(len(assign_chain), 8)
+        self.assertEqual(len(clusters_chain), 8)
+
+        # Iterations 4 to 8 are kept
+        params_chain, assign_chain, clusters_chain = \
+            sampler.run_mcmc(num_mcmc_samples=9, keep_last_half=True)
+        self.assertEqual(len(params_chain), 10)
+
+        # Iterations 6 and 8 are kept
+        params_chain, assign_chain, clusters_chain = \
+            sampler.run_mcmc(num_mcmc_samples=9, thin=2, burn_in=6,
+                             keep_last_half=True)
+        self.assertEqual(len(params_chain), 4)
+
+        # Burn in longer than the run keeps nothing
+        params_chain, assign_chain, clusters_chain = \
+            sampler.run_mcmc(num_mcmc_samples=3, burn_in=5,
+                             keep_last_half=True)
+        self.assertEqual(len(params_chain), 0)
+
+        with self.assertRaises(ValueError):
+            sampler.run_mcmc(num_mcmc_samples=5, thin=0)
+
+    def test_posterior_distribution(self):
+        # The chains should sample the exact posterior over configurations
+        model = ec.PoissonModel([1, 2, 3, 4, 5, 6, 2, 1],
+                                self.serial_interval,
+                                imported_cases=[1, 0, 2, 1, 0, 0, 0, 1],
+                                hyper_sigma=0.5)
+
+        # Every block configuration of the six time points
+        log_post = []
+        for bits in itertools.product([0, 1], repeat=5):
+            model.assignments = [0] + np.cumsum(bits).tolist()
+            log_post.append(model.posterior())
+        expected = np.exp(np.asarray(log_post) - max(log_post))
+        expected /= expected.sum()
+
+        random.seed(1)
+        np.random.seed(1)
+        model.assignments = [0] * 6
+        sampler = ec.MCMCSampler(model, 4)
+        _, assign_chain, _ = sampler.run_mcmc(
+            num_mcmc_samples=5000, burn_in=20)
+
+        assignments = np.asarray(assign_chain)
+        changes = assignments[:, 1:] != assignments[:, :-1]
+        code = changes @ (2 ** np.arange(5)[::-1])
+        freq = np.bincount(code, minlength=32) / len(code)
+
+        np.testing.assert_allclose(freq, expected, atol=0.015)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,7 @@
 
 import math
 import unittest
+import numpy as np
 import epicluster as ec
 
 
@@ -30,6 +31,60 @@ class TestPrior(unittest.TestCase):
         zs = [0] * ns[0] + [1] * ns[1] + [2] * ns[2]
         self.assertAlmostEqual(math.log(expected), prior(zs, sigma, theta))
 
+    def test_change(self):
+        prior = ec.RestrictedPYEPPF()
+        sigma = 0.45
+        theta = 1.34
+
+        # Split the middle block
+        old = [0, 0, 1, 1, 1, 2]
+        new = [0, 0, 1, 2, 2, 3]
+        self.assertAlmostEqual(
+            prior.change(3, [3], [1, 2], sigma, theta),
+            prior(new, sigma, theta) - prior(old, sigma, theta))
+
+        # Merge the first two blocks
+        new = [0, 0, 0, 0, 0, 1]
+        self.assertAlmostEqual(
+            prior.change(3, [2, 3], [5], sigma, theta),
+            prior(new, sigma, theta) - prior(old, sigma, theta))
+
+    def test_batch(self):
+        prior = ec.RestrictedPYEPPF()
+        zs = [[0, 0, 1, 1, 1, 2], [0] * 6, [0, 1, 2, 3, 4, 5]]
+
+        block_sizes = []
+        batch_index = []
+        for i, z in enumerate(zs):
+            block_sizes += [z.count(j) for j in set(z)]
+            batch_index += [i] * len(set(z))
+
+        for sigma, theta in [(0.45, 0), (0.45, 1.34)]:
+            p = prior.batch(np.array(block_sizes), np.array(batch_index), 3,
+                            sigma, theta)
+            for i, z in enumerate(zs):
+                self.assertAlmostEqual(p[i], prior(z, sigma, theta))
+
+    def test_batch_change(self):
+        prior = ec.RestrictedPYEPPF()
+
+        # Split, merge, and move a boundary of [0, 0, 1, 1, 1, 2]
+        removed_sizes = np.array([3, 2, 3, 2, 3])
+        removed_index = np.array([0, 1, 1, 2, 2])
+        added_sizes = np.array([1, 2, 5, 4, 1])
+        added_index = np.array([0, 0, 1, 2, 2])
+
+        for sigma, theta in [(0.45, 0), (0.45, 1.34)]:
+            p = prior.batch_change(np.array([3, 3, 3]),
+                                   removed_sizes, removed_index,
+                                   added_sizes, added_index, sigma, theta)
+            for i in range(3):
+                self.assertAlmostEqual(
+                    p[i],
+                    prior.change(3, removed_sizes[removed_index == i].tolist(),
+                                 added_sizes[added_index == i].tolist(),
+                                 sigma, theta))
+
     def test_find_prior_hyperparam(self):
         def expected_clusters(sigma, theta, n):
             return math.exp(ec.log_poch(theta + sigma, n) - math.log(sigma) - ec.log_poch(theta+1, n-1)) - theta/sigma
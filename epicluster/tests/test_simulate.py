@@ -0,0 +1,72 @@
+"""Test the code in the module simulate.py.
+"""
+
+import unittest
+import numpy as np
+import epicluster as ec
+
+
+class TestSimulate(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.serial_interval = [0.2, 0.5, 0.3]
+
+    def test_piecewise_constant_r(self):
+        r = ec.piecewise_constant_r([1.5, 0.5, 1.0], [2, 5], 7)
+        self.assertEqual(r.tolist(), [1.5, 1.5, 0.5, 0.5, 0.5, 1.0, 1.0])
+
+        with self.assertRaises(ValueError):
+            ec.piecewise_constant_r([1.5, 0.5], [2, 5], 7)
+
+        with self.assertRaises(ValueError):
+            ec.piecewise_constant_r([1.5, 0.5], [8], 7)
+
+    def test_simulate_renewal(self):
+        r = ec.piecewise_constant_r([1.5, 0.5], [10], 20)
+        cases = ec.simulate_renewal(
+            r, self.serial_interval, 10, num_replicates=50, seed=1)
+
+        self.assertEqual(cases.shape, (50, 23))
+        self.assertTrue(np.all(cases[:, :3] == 10))
+        self.assertTrue(np.all(cases >= 0))
+
+        # Each row can be used as the data of a model
+        model = ec.PoissonModel(cases[0].tolist(), self.serial_interval)
+        self.assertEqual(len(model.cases), 20)
+
+        # The same seed gives the same series
+        np.testing.assert_array_equal(
+            cases,
+            ec.simulate_renewal(
+                r, self.serial_interval, 10, num_replicates=50, seed=1))
+
+        # With R equal to zero there are no new cases
+        cases = ec.simulate_renewal(
+            np.zeros(5), self.serial_interval, 10, num_replicates=3,
+            overdispersion=2.0)
+        self.assertTrue(np.all(cases[:, 3:] == 0))
+
+        # Per-replicate R and imported cases
+        r = np.full((4, 5), 1.0)
+        r[0] = 0.0
+        cases = ec.simulate_renewal(
+            r, self.serial_interval, 0, num_replicates=4,
+            imported_cases=np.full(8, 5))
+        self.assertTrue(np.all(cases[0] == 0))
+
+        with self.assertRaises(ValueError):
+            ec.simulate_renewal(r, self.serial_interval, 0, num_replicates=2)
+
+    def test_simulate_renewal_mean(self):
+        # With constant infectiousness, the mean number of cases is R times
+        # the transmission potential
+        cases = ec.simulate_renewal(
+            [2.0], self.serial_interval, 100, num_replicates=20000,
+            overdispersion=5.0, seed=2)
+        self.assertAlmostEqual(cases[:, -1].mean() / 200, 1.0, places=1)
+        self.assertGreater(cases[:, -1].var(), cases[:, -1].mean())
+
+
+if __name__ == '__main__':
+    unittest.main()
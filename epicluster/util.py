@@ -2,7 +2,7 @@
 """
 
 import math
-import scipy.special
+import importlib
 
 
 def log_poch(z, m):
@@ -29,6 +29,51 @@ def log_poch(z, m):
     return math.lgamma(z+m) - math.lgamma(z)
 
 
+class LazyModule:
+    """Module which is only imported when one of its attributes is first
+    used.
+
+    Parameters
+    ----------
+    name : str
+        Full name of the module, for example 'scipy.special'
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        value = getattr(self._module, attr)
+
+        # Store the attribute, so that later lookups do not come through here
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        return '<lazy module {!r}>'.format(self._name)
+
+
+def lazy_import(name):
+    """Import a module on first use.
+
+    Heavy dependencies are imported with this function, so that importing
+    epicluster does not pay their start up cost until they are needed.
+
+    Parameters
+    ----------
+    name : str
+        Full name of the module
+
+    Returns
+    -------
+    LazyModule
+        Proxy which imports the module when one of its attributes is accessed
+    """
+    return LazyModule(name)
+
+
 def poch_negatives(z, m):
     if z == 0:
         return 0
@@ -5,6 +5,11 @@ setup(
     name='epicluster',
     description='Change points in Rt',
     version='0.1',
+    entry_points={
+        'console_scripts': [
+            'epicluster-fit = epicluster.cli:main',
+        ],
+    },
     install_requires=[
         'matplotlib',
         'numpy',